@@ -5,6 +5,9 @@ from evalcache.dircache_v2 import DirCache_v2
 from evalcache.lazy import Lazy, LazyObject, LazyHash, Memoize
 from evalcache.lazy import unlazy, encache, decache, nocache, print_tree
 from evalcache.lazy import unlazy_if_need
+from evalcache.aio import aunlazy
+from evalcache.planner import plan
 from evalcache.lazyfile import LazyFile
+from evalcache.inputfile import InputFile
 
 from evalcache.util import select, map, filter, reduce
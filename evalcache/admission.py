@@ -0,0 +1,120 @@
+"""Cost-aware admission of evaluated values to cache.
+
+Storing of a value costs a cache write, and it pays off only if loading of the
+value is cheaper than its evaluation. With Lazy option admission, values are
+stored only if their rebuild time is at least ratio times larger than
+estimated load time:
+
+    rebuild time = mean evaluation time of generic (see costs.py)
+        + rebuild times of rejected arguments
+        + load_latency for every other lazy argument
+    load time = load_latency + serialized size / load_bandwidth
+
+or mean recorded load time of the generic, if it is known. Serialized size is
+measured by pickling of first values of every generic. Values of generics
+without recorded costs are stored as usual.
+
+Rejected values are evaluated again, when they are needed, from their
+arguments. Chains of rejected nodes accumulate rebuild time, so one of them
+is stored, when its rebuild becomes expensive. Diagnostic message of rejected
+values is "skip".
+"""
+
+import pickle
+import threading
+import collections
+
+import evalcache.lazy
+import evalcache.costs
+
+
+class AdmissionPolicy:
+    """Decides, which evaluated values are stored to cache.
+
+    ratio -- value is stored if rebuild time >= ratio * estimated load time
+    load_latency -- seconds of loading, which don't depend on size
+    load_bandwidth -- bytes per second of loading
+    samples -- number of values of a generic, which are pickled
+        to measure serialized size
+    remember -- number of last rejected nodes, which rebuild times are kept
+        (older ones are counted as stored)
+    stored, skipped -- numbers of decisions
+    """
+
+    def __init__(
+        self, ratio=2.0, load_latency=1e-4, load_bandwidth=200e6, samples=3, remember=100000
+    ):
+        self.ratio = ratio
+        self.load_latency = load_latency
+        self.load_bandwidth = load_bandwidth
+        self.samples = samples
+        self.remember = remember
+        self.sizes = {}
+        self.rebuild = collections.OrderedDict()
+        self.stored = 0
+        self.skipped = 0
+        self.lock = threading.Lock()
+
+    def serialized_size(self, name, value):
+        """Mean serialized size of values of generic name"""
+        with self.lock:
+            stat = self.sizes.get(name)
+            if stat is not None and stat[0] >= self.samples:
+                return stat[1] / stat[0]
+
+        try:
+            size = len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        except Exception:
+            # Cache reports the error on store.
+            return 0
+
+        with self.lock:
+            stat = self.sizes.setdefault(name, [0, 0])
+            stat[0] += 1
+            stat[1] += size
+            return stat[1] / stat[0]
+
+    def load_time(self, name, value, costs):
+        loaded = costs.load_functions.get(name)
+        if loaded is not None:
+            return loaded[1] / loaded[0]
+        return self.load_latency + self.serialized_size(name, value) / self.load_bandwidth
+
+    def rebuild_time(self, obj, seconds):
+        """Time of evaluation of obj and of getting of its arguments"""
+        with self.lock:
+            for child in evalcache.lazy.lazy_children(obj):
+                if evalcache.lazy.is_trivial(child):
+                    # Endpoint.
+                    continue
+                known = self.rebuild.get(child.__lazyhexhash__)
+                seconds += known if known is not None else self.load_latency
+        return seconds
+
+    def admit(self, obj, value, costs):
+        """True if value of obj should be stored to cache"""
+        name = evalcache.costs.generic_name(obj)
+        estimate = costs.functions.get(name) if name is not None else None
+        if estimate is None:
+            ret = True
+        else:
+            seconds = self.rebuild_time(obj, estimate[1] / estimate[0])
+            # Cheap nodes are rejected without measuring of their values.
+            ret = seconds >= self.ratio * self.load_latency and (
+                seconds >= self.ratio * self.load_time(name, value, costs)
+            )
+
+        with self.lock:
+            if ret:
+                self.stored += 1
+            else:
+                self.skipped += 1
+                self.rebuild[obj.__lazyhexhash__] = seconds
+                if len(self.rebuild) > self.remember:
+                    self.rebuild.popitem(last=False)
+        return ret
+
+    def __repr__(self):
+        return "AdmissionPolicy(ratio={}, load_latency={}, load_bandwidth={}, stored={}, skipped={})".format(
+            self.ratio, self.load_latency, self.load_bandwidth, self.stored, self.skipped
+        )
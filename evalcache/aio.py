@@ -0,0 +1,244 @@
+"""Coroutine-based evaluation of lazy trees.
+
+    value = await evalcache.aunlazy(obj)
+
+Async-def generics are awaited. Other generics are executed in an executor,
+so the event loop isn't blocked by computations. Builtin functions
+(operators, len, round, ...) are cheap and are called in place.
+
+Independent subtrees are evaluated concurrently. Concurrent requests for
+equal hashes await a single in-flight computation.
+
+Cache can implement the async protocol:
+    async acontains(key), async aget(key), async aset(key, value), async adel(key)
+Ordinary dict-like caches are used through AsyncCacheAdapter, which performs
+loads and stores in an executor.
+"""
+
+import types
+import asyncio
+import inspect
+import functools
+
+import evalcache.lazy
+import evalcache.parallel
+
+
+class AsyncCacheAdapter:
+    """Async protocol for dict-like cache. Loads and stores are executed in executor."""
+
+    def __init__(self, cache, executor=None):
+        self.cache = cache
+        self.executor = executor
+        self.lock = evalcache.parallel._cache_access(cache)
+
+    def _locked(self, func, *args):
+        if self.lock is None:
+            return func(*args)
+        with self.lock:
+            return func(*args)
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._locked, func, *args)
+
+    async def acontains(self, key):
+        # Key lookup of DirCache's is in memory.
+        return self._locked(self.cache.__contains__, key)
+
+    async def aget(self, key):
+        return await self._run(self.cache.__getitem__, key)
+
+    async def aset(self, key, value):
+        return await self._run(self.cache.__setitem__, key, value)
+
+    async def adel(self, key):
+        return await self._run(self.cache.__delitem__, key)
+
+
+class DictCacheAdapter:
+    """Async protocol for in-memory dict"""
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    async def acontains(self, key):
+        return key in self.cache
+
+    async def aget(self, key):
+        return self.cache[key]
+
+    async def aset(self, key, value):
+        self.cache[key] = value
+
+    async def adel(self, key):
+        del self.cache[key]
+
+
+def async_cache(cache, executor=None):
+    """Get async protocol implementation for cache"""
+    if hasattr(cache, "aget"):
+        return cache
+    if type(cache) is dict:
+        return DictCacheAdapter(cache)
+    return AsyncCacheAdapter(cache, executor)
+
+
+def _inflight(lazifier):
+    inflight = getattr(lazifier, "_inflight", None)
+    if inflight is None:
+        inflight = lazifier._inflight = {}
+    return inflight
+
+
+async def aunlazy(obj, executor=None):
+    """Get a result of evaluation of lazy object (see evalcache.lazy.unlazy).
+
+    executor -- concurrent.futures executor for sync generics and cache operations.
+        Default executor of the loop is used if it is None.
+    """
+    lazifier = obj.__lazybase__
+    evalcache.lazy.check_release_values(lazifier, "asyncio")
+
+    if obj.__lazyheap__:
+        value = obj.__lazyvalue__
+        msg = "endp" if evalcache.lazy.is_trivial(obj) else "fget"
+        evalcache.lazy.value_known(obj, msg)
+        if lazifier.status_notify:
+            evalcache.lazy.notify_start_node(obj)
+        if lazifier.diag:
+            evalcache.lazy.print_diag(obj, msg)
+        if lazifier.status_notify:
+            evalcache.lazy.notify_fini_node(obj)
+        return value
+
+    loop = asyncio.get_running_loop()
+    inflight = _inflight(lazifier)
+    key = obj.__lazyhexhash__
+
+    task = inflight.get(key)
+    if task is None or task.get_loop() is not loop:
+        task = loop.create_task(_node(obj, executor))
+        inflight[key] = task
+
+        def forget(t, key=key):
+            if inflight.get(key) is t:
+                del inflight[key]
+
+        task.add_done_callback(forget)
+
+    # Cancellation of one of the waiters doesn't cancel the shared computation.
+    value = await asyncio.shield(task)
+
+    if not obj.__lazyheap__:
+        evalcache.lazy.set_lazyvalue(obj, value)
+    return value
+
+
+async def _node(obj, executor):
+    lazifier = obj.__lazybase__
+    cache = async_cache(lazifier.cache, executor)
+    key = obj.__lazyhexhash__
+
+    if lazifier.status_notify:
+        evalcache.lazy.notify_start_node(obj)
+
+    if obj.__decache__ and await cache.acontains(key):
+        msg = "load"
+        try:
+            value = await cache.aget(key)
+            evalcache.lazy.set_lazyvalue(obj, value)
+        except Exception:
+            msg = evalcache.lazy.broken_entry(None, key)
+            try:
+                await cache.adel(key)
+            except KeyError:
+                # Already removed by another task or process.
+                pass
+
+            value = await _lazydo(obj, executor)
+            evalcache.lazy.set_lazyvalue(obj, value)
+            await cache.aset(key, value)
+
+    else:
+        value = await _lazydo(obj, executor)
+        evalcache.lazy.set_lazyvalue(obj, value)
+
+        if obj.__encache__ and evalcache.lazy.admitted(obj, value):
+            msg = "save"
+            await cache.aset(key, value)
+        elif obj.__encache__:
+            msg = "skip"
+        else:
+            msg = "eval"
+
+    value = obj.__lazyvalue__
+    evalcache.lazy.value_known(obj, msg)
+
+    if lazifier.diag:
+        evalcache.lazy.print_diag(obj, msg)
+
+    if lazifier.status_notify:
+        evalcache.lazy.notify_fini_node(obj)
+
+    return value
+
+
+def _inplace(func):
+    return (
+        isinstance(func, types.BuiltinFunctionType)
+        or func is evalcache.lazy.lazy_getattr
+    )
+
+
+async def _lazydo(obj, executor):
+    evalcache.lazy.check_evaluable(obj)
+
+    func, args, kwargs = await asyncio.gather(
+        _expand(obj.generic, executor),
+        _expand(obj.args, executor),
+        _expand(obj.kwargs, executor),
+    )
+
+    evalcache.lazy.restore_prevented_arguments(obj, func, args, kwargs)
+
+    if inspect.iscoroutinefunction(func):
+        result = await func(*args, **kwargs)
+    elif _inplace(func):
+        result = func(*args, **kwargs)
+    else:
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(
+            executor, functools.partial(func, *args, **kwargs)
+        )
+
+    if inspect.isawaitable(result):
+        result = await result
+
+    return await _expand(result, executor)
+
+
+def _need_expand(arg):
+    return isinstance(arg, (evalcache.lazy.LazyObject, list, tuple, dict))
+
+
+async def _expand(arg, executor):
+    """Expansion of argument (see evalcache.lazy.expand). Items are expanded concurrently."""
+    if isinstance(arg, (list, tuple)):
+        ret = list(arg)
+        idxs = [i for i, a in enumerate(ret) if _need_expand(a)]
+        values = await asyncio.gather(*(_expand(ret[i], executor) for i in idxs))
+        for i, v in zip(idxs, values):
+            ret[i] = v
+        return ret
+
+    elif isinstance(arg, dict):
+        items = list(arg.items())
+        keys = await asyncio.gather(*(_expand(k, executor) for k, _ in items))
+        values = await asyncio.gather(*(_expand(v, executor) for _, v in items))
+        return dict(zip(keys, values))
+
+    elif isinstance(arg, evalcache.lazy.LazyObject):
+        return await aunlazy(arg, executor)
+
+    return arg
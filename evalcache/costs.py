@@ -0,0 +1,212 @@
+"""Recorded costs of evaluation and loading of lazy objects.
+
+With Lazy option record_costs evaluators measure duration of every generic
+call (without evaluation of arguments) and of every cache load, together with
+approximate sizes of values (see retention.approx_size). Evaluations are
+aggregated by generic name, loads are kept per cache key.
+
+Costs are stored to a file next to the directory cache (see costs_path),
+so next runs (and evalcache.plan) can estimate evaluation of trees before it
+starts. Costs of other caches are kept in memory only, unless record_costs
+is a file path. Loads are kept for the last LOADS_LIMIT keys.
+"""
+
+import os
+import atexit
+import pickle
+import tempfile
+import threading
+import collections
+
+import evalcache.lazy
+from evalcache.retention import approx_size
+
+LOADS_LIMIT = 100000
+
+
+def costs_path(lazifier):
+    """Path of costs file of lazifier or None.
+
+    It is record_costs option, if it is a path, otherwise file next to
+    the directory cache.
+    """
+    if isinstance(lazifier.record_costs, str):
+        return lazifier.record_costs
+    dirpath = getattr(lazifier.cache, "dirpath", None)
+    if dirpath is None:
+        return None
+    return os.path.normpath(dirpath) + ".costs"
+
+
+def generic_name(obj):
+    """Name of lazy object's generic or None if it isn't known.
+
+    Name doesn't depend on evaluation state, so it is the same for
+    recording and planning.
+    """
+    LazyObject = evalcache.lazy.LazyObject
+
+    generic = obj.generic
+    if isinstance(generic, LazyObject):
+        if generic.__lazyheap__ and generic.generic is None:
+            generic = generic.__lazyvalue__
+        elif (
+            generic.generic is evalcache.lazy.lazy_getattr
+            and len(generic.args) > 1
+            and isinstance(generic.args[1], str)
+        ):
+            # Method call.
+            return "." + generic.args[1]
+        else:
+            return None
+
+    if generic is None:
+        return None
+
+    qualname = getattr(generic, "__qualname__", None)
+    if not isinstance(qualname, str):
+        return type(generic).__qualname__
+    module = getattr(generic, "__module__", None)
+    return qualname if module is None else module + "." + qualname
+
+
+class Costs:
+    """Measured costs.
+
+    functions -- generic name -> [evaluations, seconds, bytes] (sums)
+    loads -- cache key -> (seconds, bytes) of the last load, for no more than
+        limit recently loaded keys
+    load_functions -- generic name -> [loads, seconds, bytes] (sums)
+    dirty -- there are records, which aren't saved
+    """
+
+    def __init__(self, functions=None, loads=None, load_functions=None, limit=LOADS_LIMIT):
+        self.functions = functions if functions is not None else {}
+        self.loads = collections.OrderedDict(loads if loads is not None else ())
+        self.limit = limit
+        self.load_functions = load_functions if load_functions is not None else {}
+        self.dirty = False
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _add(table, name, seconds, nbytes):
+        stat = table.get(name)
+        if stat is None:
+            table[name] = [1, seconds, nbytes]
+        else:
+            stat[0] += 1
+            stat[1] += seconds
+            stat[2] += nbytes
+
+    @staticmethod
+    def _mean(table, name):
+        stat = table.get(name)
+        if stat is None:
+            return None
+        return stat[1] / stat[0], stat[2] / stat[0]
+
+    def record_eval(self, obj, seconds, value):
+        """Account evaluation of obj's generic, which took seconds"""
+        name = generic_name(obj)
+        if name is None:
+            return
+        nbytes = approx_size(value)
+        with self.lock:
+            self._add(self.functions, name, seconds, nbytes)
+            self.dirty = True
+
+    def record_load(self, obj, seconds, value):
+        """Account loading of obj's value from cache, which took seconds"""
+        nbytes = approx_size(value)
+        name = generic_name(obj)
+        key = obj.__lazyhexhash__
+        with self.lock:
+            self.loads[key] = (seconds, nbytes)
+            self.loads.move_to_end(key)
+            while len(self.loads) > self.limit:
+                self.loads.popitem(last=False)
+            if name is not None:
+                self._add(self.load_functions, name, seconds, nbytes)
+            self.dirty = True
+
+    def eval_estimate(self, obj):
+        """Mean (seconds, bytes) of evaluation of obj's generic or None"""
+        name = generic_name(obj)
+        if name is None:
+            return None
+        return self._mean(self.functions, name)
+
+    def load_estimate(self, obj):
+        """(seconds, bytes) of loading of obj from cache or None.
+
+        Recorded load of the key is used, otherwise mean load of the generic.
+        If only evaluations of the generic are known, loading time is
+        estimated by mean load rate of the cache.
+        """
+        known = self.loads.get(obj.__lazyhexhash__)
+        if known is not None:
+            return known
+        name = generic_name(obj)
+        if name is None:
+            return None
+        estimate = self._mean(self.load_functions, name)
+        if estimate is not None:
+            return estimate
+
+        evaluated = self._mean(self.functions, name)
+        rate = self.load_rate()
+        if evaluated is None or rate is None:
+            return None
+        return evaluated[1] * rate, evaluated[1]
+
+    def load_rate(self):
+        """Mean seconds per byte of recorded loads or None"""
+        seconds = sum(s for s, _ in self.loads.values())
+        nbytes = sum(b for _, b in self.loads.values())
+        return seconds / nbytes if nbytes else None
+
+    def as_dict(self):
+        with self.lock:
+            return {
+                "functions": {k: list(v) for k, v in self.functions.items()},
+                "loads": dict(self.loads),
+                "load_functions": {k: list(v) for k, v in self.load_functions.items()},
+            }
+
+    @classmethod
+    def load(cls, path):
+        """Costs, which are stored in file path, or empty costs"""
+        if path is None or not os.path.exists(path):
+            return cls()
+        try:
+            with open(path, "rb") as f:
+                stored = pickle.load(f)
+            return cls(stored["functions"], stored["loads"], stored["load_functions"])
+        except Exception:
+            print("Warning: Broken evaluation costs file {}. It is ignored.".format(path))
+            return cls()
+
+    def save(self, path):
+        """Store costs to file path, if there are new records. Records of 
+        other processes, which were stored meanwhile, are replaced."""
+        if path is None or not self.dirty:
+            return
+        data = self.as_dict()
+        self.dirty = False
+
+        dirpath = os.path.dirname(os.path.abspath(path))
+        os.makedirs(dirpath, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=dirpath, prefix=".costs-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(data, f)
+            os.replace(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+
+def save_at_exit(costs, path):
+    """Save costs to file path at interpreter exit. The handler holds costs."""
+    if path is not None:
+        atexit.register(costs.save, path)
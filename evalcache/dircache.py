@@ -2,6 +2,7 @@
 
 import os
 import pickle
+import threading
 
 
 class DirCache:
@@ -18,6 +19,11 @@ class DirCache:
 	IOException
 	"""
 
+	# Different keys can be stored and loaded from different threads.
+	# Values are written to temporary files and renamed, so readers never 
+	# see partial files.
+	thread_safe = True
+
 	def __init__(self, dirpath):
 		self.dirpath = dirpath
 
@@ -29,23 +35,59 @@ class DirCache:
 
 	def update(self):
 		lst = os.listdir(self.dirpath)
-		self.files = set(lst)
+		# Temporary files of unfinished writes are hidden.
+		self.files = set(f for f in lst if not f.startswith("."))
+
+	def refresh(self, key):
+		"""Update state of key, which can be changed by another process"""
+		if os.path.exists(self.makePathTo(key)):
+			self.files.add(key)
+		else:
+			self.files.discard(key)
 
 	def __contains__(self, key):
 		return key in self.files
 
 	def __setitem__(self, key, value):
-		with open(os.path.join(self.dirpath, key), "wb") as fl:
+		tmppath = os.path.join(
+			self.dirpath, ".{}.{}.{}".format(key, os.getpid(), threading.get_ident()))
+		with open(tmppath, "wb") as fl:
 			pickle.dump(value, fl)
+		os.replace(tmppath, os.path.join(self.dirpath, key))
 		self.files.add(key)
 
 	def __getitem__(self, key):
 		with open(os.path.join(self.dirpath, key), "rb") as fl:
 			return pickle.load(fl)
 
+	def contains_many(self, keys):
+		"""Subset of keys, which are stored in cache"""
+		return self.files.intersection(keys)
+
+	def get_many(self, keys):
+		"""Load stored keys. Keys, which can't be loaded, are omitted."""
+		ret = {}
+		for key in self.files.intersection(keys):
+			try:
+				ret[key] = self[key]
+			except Exception:
+				pass
+		return ret
+
+	def set_many(self, items):
+		if isinstance(items, dict):
+			items = items.items()
+		for key, value in items:
+			self[key] = value
+
 	def __delitem__(self, key):
-		os.remove(os.path.join(self.dirpath, key))
-		self.files.remove(key)
+		try:
+			os.remove(os.path.join(self.dirpath, key))
+		except FileNotFoundError:
+			# Removed by another thread or process.
+			self.files.discard(key)
+			raise KeyError(key)
+		self.files.discard(key)
 
 	def clean(self):
 		for k in self.keys():
@@ -2,6 +2,7 @@
 
 import os
 import pickle
+import threading
 
 
 class DirCache_v2:
@@ -22,6 +23,10 @@ class DirCache_v2:
 	IOException
 	"""
 
+    # Different keys can be stored and loaded from different threads.
+    # State of prefixes is guarded by lock, values are written atomically.
+    thread_safe = True
+
     @staticmethod
     def key_prefix(key):
         return key[:2]
@@ -32,6 +37,7 @@ class DirCache_v2:
 
     def __init__(self, dirpath):
         self.dirpath = dirpath
+        self.lock = threading.RLock()
         if not os.path.exists(dirpath):
             os.mkdir(dirpath)
             self.prefixes = set()
@@ -48,14 +54,26 @@ class DirCache_v2:
         if "tmp" in self.prefixes: 
             self.prefixes.remove("tmp")      
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.RLock()
+
     def update_prefix(self, prefix):
         dirpath = os.path.join(self.dirpath, prefix)
-        if not os.path.exists(dirpath):
-            os.mkdir(dirpath)
-            self.prefixes_cache[prefix] = set()
-        else:
+        with self.lock:
+            os.makedirs(dirpath, exist_ok=True)
             lst = [prefix + rkey for rkey in os.listdir(dirpath)]
             self.prefixes_cache[prefix] = set(lst)
+            self.prefixes.add(prefix)
+
+    def refresh(self, key):
+        """Update state of key, which can be changed by another process"""
+        self.update_prefix(self.key_prefix(key))
 
     def __contains__(self, key):
         prefix = self.key_prefix(key)
@@ -73,9 +91,17 @@ class DirCache_v2:
         if prefix not in self.prefixes_cache:
             self.update_prefix(prefix)
 
-        with open(os.path.join(self.dirpath, self.key_to_relpath(key)), "wb") as fl:
+        # Value is written to temporary file and renamed, so readers
+        # and directory listings never see partial files.
+        tmppath = os.path.join(
+            self._tmpdir, "{}.{}.{}".format(key, os.getpid(), threading.get_ident())
+        )
+        with open(tmppath, "wb") as fl:
             pickle.dump(value, fl)
-        self.prefixes_cache[prefix].add(key)
+        os.replace(tmppath, os.path.join(self.dirpath, self.key_to_relpath(key)))
+
+        with self.lock:
+            self.prefixes_cache[prefix].add(key)
 
     def __getitem__(self, key):
         prefix = self.key_prefix(key)
@@ -89,6 +115,42 @@ class DirCache_v2:
         with open(os.path.join(self.dirpath, self.key_to_relpath(key)), "rb") as fl:
             return pickle.load(fl)
 
+    def _group_by_prefix(self, keys):
+        groups = {}
+        for key in keys:
+            groups.setdefault(self.key_prefix(key), []).append(key)
+        return groups
+
+    def contains_many(self, keys):
+        """Subset of keys, which are stored in cache.
+        Every prefix directory is listed once at most."""
+        ret = set()
+        for prefix, group in self._group_by_prefix(keys).items():
+            if prefix not in self.prefixes:
+                continue
+            if prefix not in self.prefixes_cache:
+                self.update_prefix(prefix)
+            with self.lock:
+                ret.update(self.prefixes_cache[prefix].intersection(group))
+        return ret
+
+    def get_many(self, keys):
+        """Load stored keys. Keys, which can't be loaded, are omitted."""
+        ret = {}
+        for key in self.contains_many(keys):
+            try:
+                with open(os.path.join(self.dirpath, self.key_to_relpath(key)), "rb") as fl:
+                    ret[key] = pickle.load(fl)
+            except Exception:
+                pass
+        return ret
+
+    def set_many(self, items):
+        if isinstance(items, dict):
+            items = items.items()
+        for key, value in items:
+            self[key] = value
+
     def __delitem__(self, key):
         prefix = self.key_prefix(key)
 
@@ -98,13 +160,18 @@ class DirCache_v2:
         if key not in self.prefixes_cache[prefix]:
             raise KeyError
 
-        os.remove(os.path.join(self.dirpath, self.key_to_relpath(key)))
-        self.prefixes_cache[prefix].remove(key)
+        with self.lock:
+            try:
+                os.remove(os.path.join(self.dirpath, self.key_to_relpath(key)))
+            except FileNotFoundError:
+                # Removed by another process.
+                pass
+            self.prefixes_cache[prefix].discard(key)
 
     def keys(self):
         ret = set()
 
-        for p in self.prefixes:
+        for p in list(self.prefixes):
             self.update_prefix(p)
 
         for p in self.prefixes_cache:
@@ -0,0 +1,363 @@
+"""Explicit stack evaluator of lazy trees.
+
+Evaluation of every lazy object is presented as a generator, which yields
+lazy objects, whose values it needs, and receives those values back.
+The driver loop keeps generators in a list instead of the Python stack,
+so tree depth is not limited by recursion limit.
+
+The evaluator has the same semantics as recursive evalcache.lazy.unlazy:
+local values, cache loading and storing, reevaluation of broken cache
+entries, prevent_unwrap lists, diagnostic output and status callbacks.
+Lazy objects, which are created and unlazied inside evaluated functions,
+are evaluated by a nested driver loop.
+"""
+
+import time
+import collections
+
+import evalcache.lazy
+import evalcache.prefetch
+import evalcache.retention
+
+
+class Plan:
+    """Nodes of lazy tree, which should be loaded or evaluated.
+
+    Caches are probed by batches, which don't go below stored nodes
+    (see evalcache.lazy.tree_cache_state).
+
+    nodes -- hash -> lazy objects with that hash
+    toload -- hashes of nodes, which are loaded from cache
+    loadorder -- toload hashes in order of reaching by evaluation
+    deps -- hash -> hashes of nodes, which must be done before
+    """
+
+    def __init__(self, root):
+        self.nodes = {}
+        self.toload = set()
+        self.loadorder = []
+        self.deps = {}
+
+        incache = evalcache.lazy.tree_cache_state(
+            root, skip_heap=True, stop=lambda o: o.__decache__
+        )
+
+        stack = [root]
+        while stack:
+            obj = stack.pop()
+            if obj.__lazyheap__:
+                continue
+
+            key = obj.__lazyhexhash__
+            if key in self.nodes:
+                self.nodes[key].append(obj)
+                continue
+            self.nodes[key] = [obj]
+
+            if obj.__decache__ and incache(obj):
+                self.toload.add(key)
+                self.loadorder.append(key)
+                self.deps[key] = set()
+                continue
+
+            children = [
+                c for c in evalcache.lazy.lazy_children(obj) if not c.__lazyheap__
+            ]
+            self.deps[key] = set(c.__lazyhexhash__ for c in children)
+            stack.extend(reversed(children))
+
+
+class BatchLoad:
+    """Values of planned nodes, which are loaded from cache by get_many
+    batches in order of evaluation.
+
+    Batch is loaded when evaluation reaches a key, which isn't loaded yet.
+    It contains the key and the next planned keys, no more than limit. So
+    memory is bounded by the number of loaded values, which are not used yet.
+    It is used as dict of values like evalcache.prefetch.ReadAhead.
+    """
+
+    def __init__(self, lazifier, plan):
+        self.cache = lazifier.cache
+        self.costs = lazifier.costs
+        self.plan = plan
+        self.limit = max(1, lazifier.prefetch_limit)
+        self.pending = collections.OrderedDict.fromkeys(plan.loadorder)
+        self.values = {}
+
+    def __contains__(self, key):
+        return key in self.values or key in self.pending
+
+    def pop(self, key):
+        if key in self.pending:
+            self.load(key)
+        try:
+            return self.values.pop(key)
+        except KeyError:
+            # Batch loading failed, key is read alone to get its error.
+            return self.cache[key]
+
+    def load(self, key):
+        del self.pending[key]
+        keys = [key]
+        while self.pending and len(keys) < self.limit:
+            keys.append(self.pending.popitem(last=False)[0])
+
+        try:
+            start = time.perf_counter()
+            values = evalcache.lazy.get_many(self.cache, keys)
+            elapsed = time.perf_counter() - start
+        except Exception:
+            return
+        self.values.update(values)
+
+        if self.costs is not None and values:
+            # Duration of the batch is shared by its values.
+            for k, value in values.items():
+                self.costs.record_load(
+                    self.plan.nodes[k][0], elapsed / len(values), value
+                )
+
+    def close(self):
+        self.pending.clear()
+        self.values.clear()
+
+
+class Prefetch:
+    """Cache state of planned tree.
+
+    Stored root is probed by the first batch, so its value is loaded without
+    planning of the tree.
+
+    values -- evalcache.engine.BatchLoad of planned nodes or
+        evalcache.prefetch.ReadAhead if the lazifier has prefetch option
+    absent -- keys of nodes, which should be evaluated
+    Keys of other nodes (f.e. created during evaluation) are probed one by one.
+
+    With release_values option, consumers counts keys of nodes, which are
+    still waited by planned nodes (see release).
+    """
+
+    def __init__(self, root):
+        lazifier = root.__lazybase__
+        plan = Plan(root)
+        self.plan = plan
+        self.root = root
+        self.cache = lazifier.cache
+        self.consumers = None
+        if lazifier.release_values:
+            self.consumers = dict.fromkeys(plan.nodes, 0)
+            self.persisted = set()
+            self.done = set()
+            for deps in plan.deps.values():
+                for dep in deps:
+                    self.consumers[dep] += 1
+        self.absent = set(
+            key
+            for key, objs in plan.nodes.items()
+            if key not in plan.toload and objs[0].__lazybase__.cache is self.cache
+        )
+
+        if evalcache.prefetch.available(lazifier):
+            self.values = evalcache.prefetch.read_ahead(lazifier, plan)
+        else:
+            self.values = BatchLoad(lazifier, plan)
+
+    def release(self, obj, msg):
+        """Node obj is done. Drop stored values of its planned arguments,
+        which aren't waited by other planned nodes."""
+        key = obj.__lazyhexhash__
+        if key not in self.consumers or key in self.done:
+            return
+        self.done.add(key)
+        if msg in evalcache.retention.ValueRetention.PERSISTED:
+            self.persisted.add(key)
+
+        for dep in self.plan.deps[key]:
+            self.consumers[dep] -= 1
+            if self.consumers[dep] == 0 and dep in self.persisted:
+                for o in self.plan.nodes[dep]:
+                    if o is not self.root and o.__lazyheap__:
+                        o.__lazyvalue__ = None
+                        o.__lazyheap__ = False
+
+    def close(self):
+        self.values.close()
+
+
+def evaluate(obj):
+    """Get a result of evaluation of lazy object (see evalcache.lazy.unlazy)"""
+    prefetch = None
+    if not obj.__lazyheap__ and obj.__lazybase__.cache is not None:
+        prefetch = Prefetch(obj)
+
+    try:
+        return _drive(obj, prefetch)
+    finally:
+        if prefetch is not None:
+            prefetch.close()
+
+
+def _drive(obj, prefetch):
+    stack = [node_steps(obj, prefetch)]
+    value = None
+
+    while stack:
+        try:
+            child = stack[-1].send(value)
+        except StopIteration as ret:
+            stack.pop()
+            value = ret.value
+            continue
+
+        lazifier = child.__lazybase__
+        if child.__lazyheap__ and not (lazifier.status_notify or lazifier.diag):
+            # Fast path for already known values.
+            value = child.__lazyvalue__
+        else:
+            stack.append(node_steps(child, prefetch))
+            value = None
+
+    return value
+
+
+def stored(obj, prefetch):
+    """True if value of obj is stored in its cache. Cache state of planned
+    tree is used, if obj is planned by prefetch."""
+    key = obj.__lazyhexhash__
+    if prefetch is not None and obj.__lazybase__.cache is prefetch.cache:
+        if key in prefetch.values:
+            return True
+        if key in prefetch.absent:
+            return False
+    return key in obj.__lazybase__.cache
+
+
+def node_steps(obj, prefetch=None):
+    """Evaluation of one lazy object.
+
+    prefetch -- Prefetch of evaluated tree or None.
+    """
+    lazifier = obj.__lazybase__
+
+    if lazifier.status_notify:
+        evalcache.lazy.notify_start_node(
+            obj, prefetch.plan if prefetch is not None else None
+        )
+
+    if obj.__lazyheap__:
+        msg = "endp" if evalcache.lazy.is_trivial(obj) else "fget"
+
+    elif obj.__decache__ and stored(obj, prefetch):
+        msg = "load"
+        try:
+            if prefetch is not None and obj.__lazyhexhash__ in prefetch.values:
+                value = prefetch.values.pop(obj.__lazyhexhash__)
+            elif lazifier.costs is not None:
+                start = time.perf_counter()
+                value = lazifier.cache[obj.__lazyhexhash__]
+                lazifier.costs.record_load(obj, time.perf_counter() - start, value)
+            else:
+                value = lazifier.cache[obj.__lazyhexhash__]
+            evalcache.lazy.set_lazyvalue(obj, value)
+        except Exception:
+            msg = evalcache.lazy.broken_entry(lazifier.cache, obj.__lazyhexhash__)
+
+            value = yield from lazydo_steps(obj)
+            evalcache.lazy.set_lazyvalue(obj, value)
+            lazifier.cache[obj.__lazyhexhash__] = obj.__lazyvalue__
+
+    else:
+        value = yield from lazydo_steps(obj)
+        evalcache.lazy.set_lazyvalue(obj, value)
+
+        if obj.__encache__ and evalcache.lazy.admitted(obj, value):
+            msg = "save"
+            lazifier.cache[obj.__lazyhexhash__] = obj.__lazyvalue__
+            if prefetch is not None:
+                prefetch.absent.discard(obj.__lazyhexhash__)
+        elif obj.__encache__:
+            msg = "skip"
+        else:
+            msg = "eval"
+
+    value = obj.__lazyvalue__
+    evalcache.lazy.value_known(obj, msg)
+    if prefetch is not None and prefetch.consumers is not None:
+        prefetch.release(obj, msg)
+
+    if lazifier.diag:
+        evalcache.lazy.print_diag(obj, msg)
+
+    if lazifier.status_notify:
+        evalcache.lazy.notify_fini_node(obj)
+
+    return value
+
+
+def lazydo_steps(obj):
+    """Evaluation of generic with expanded arguments (see evalcache.lazy.lazydo)"""
+    LazyObject = evalcache.lazy.LazyObject
+    evalcache.lazy.check_evaluable(obj)
+
+    # Generic and positional arguments are expanded inline. It is the most
+    # frequent case and it saves generator creation per node.
+    func = obj.generic
+    if isinstance(func, LazyObject):
+        func = yield func
+    elif isinstance(func, (list, tuple, dict)):
+        func = yield from expand_steps(func)
+
+    args = []
+    for a in obj.args:
+        if isinstance(a, LazyObject):
+            a = yield a
+        elif isinstance(a, (list, tuple, dict)):
+            a = yield from expand_steps(a)
+        args.append(a)
+
+    kwargs = (yield from expand_steps(obj.kwargs)) if obj.kwargs else {}
+
+    evalcache.lazy.restore_prevented_arguments(obj, func, args, kwargs)
+
+    costs = obj.__lazybase__.costs
+    if costs is not None:
+        start = time.perf_counter()
+    result = func(*args, **kwargs)
+    if costs is not None:
+        elapsed = time.perf_counter() - start
+    if isinstance(result, (LazyObject, list, tuple, dict)):
+        result = yield from expand_steps(result)
+    if costs is not None:
+        costs.record_eval(obj, elapsed, result)
+    return result
+
+
+def expand_steps(arg):
+    """Expansion of argument (see evalcache.lazy.expand)"""
+    LazyObject = evalcache.lazy.LazyObject
+
+    if isinstance(arg, (list, tuple)):
+        ret = []
+        for a in arg:
+            if isinstance(a, LazyObject):
+                a = yield a
+            elif isinstance(a, (list, tuple, dict)):
+                a = yield from expand_steps(a)
+            ret.append(a)
+        return ret
+
+    elif isinstance(arg, dict):
+        ret = {}
+        for k, v in arg.items():
+            if isinstance(k, (LazyObject, list, tuple, dict)):
+                k = yield from expand_steps(k)
+            if isinstance(v, (LazyObject, list, tuple, dict)):
+                v = yield from expand_steps(v)
+            ret[k] = v
+        return ret
+
+    elif isinstance(arg, LazyObject):
+        return (yield arg)
+
+    return arg
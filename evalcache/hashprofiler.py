@@ -0,0 +1,123 @@
+import sys
+import time
+
+
+class ProfilingHash:
+    """Hashlib-like wrapper, which counts bytes fed to the hash object"""
+
+    def __init__(self, m, profiler):
+        self.m = m
+        self.profiler = profiler
+
+    def update(self, data):
+        self.profiler.feed(memoryview(data).nbytes)
+        self.m.update(data)
+
+    def digest(self):
+        return self.m.digest()
+
+    def hexdigest(self):
+        return self.m.hexdigest()
+
+
+def function_name(func):
+    """Name of hash function for statistic (partials and callable objects have no __name__)"""
+    return getattr(func, "__qualname__", None) or repr(func)
+
+
+class HashProfiler:
+    """Aggregated statistic of key construction.
+
+    Statistic is collected per argument type and per hash function:
+    calls -- number of updatehash invocations
+    cumtime -- time including nested updatehash invocations
+    selftime -- time excluding nested updatehash invocations
+    bytes -- bytes fed to the hash object by the invocation itself
+    cumbytes -- bytes fed including nested invocations
+    """
+
+    FIELDS = ("calls", "cumtime", "selftime", "bytes", "cumbytes")
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.types = {}
+        self.hashfuncs = {}
+        self.total_bytes = 0
+        self._stack = []
+        self._active = {}
+
+    def enter(self, typename, funcname):
+        # frame: start time, nested time, self bytes, nested bytes, keys
+        keys = (("types", typename), ("hashfuncs", funcname))
+        for key in keys:
+            self._active[key] = self._active.get(key, 0) + 1
+        self._stack.append([time.perf_counter(), 0.0, 0, 0, keys])
+
+    def feed(self, nbytes):
+        self.total_bytes += nbytes
+        if self._stack:
+            self._stack[-1][2] += nbytes
+
+    def leave(self):
+        start, nested, selfbytes, nestedbytes, keys = self._stack.pop()
+        elapsed = time.perf_counter() - start
+        cumbytes = selfbytes + nestedbytes
+
+        if self._stack:
+            self._stack[-1][1] += elapsed
+            self._stack[-1][3] += cumbytes
+
+        for key in keys:
+            self._active[key] -= 1
+            table = getattr(self, key[0])
+            stat = table.get(key[1])
+            if stat is None:
+                stat = table[key[1]] = dict.fromkeys(self.FIELDS, 0)
+
+            stat["calls"] += 1
+            stat["selftime"] += elapsed - nested
+            stat["bytes"] += selfbytes
+
+            # Recursive invocations are accounted in outermost frame only.
+            if self._active[key] == 0:
+                stat["cumtime"] += elapsed
+                stat["cumbytes"] += cumbytes
+
+    def as_dict(self):
+        return {
+            "types": {k: dict(v) for k, v in self.types.items()},
+            "hashfuncs": {k: dict(v) for k, v in self.hashfuncs.items()},
+            "total_bytes": self.total_bytes,
+        }
+
+    def table(self, by="types", sort="cumtime", limit=None):
+        """Format statistic as text table sorted by field in descending order"""
+        stats = sorted(
+            getattr(self, by).items(), key=lambda kv: kv[1][sort], reverse=True
+        )
+        if limit is not None:
+            stats = stats[:limit]
+
+        lines = [
+            "{:>8} {:>10} {:>10} {:>12} {:>12}  {}".format(
+                "calls", "cumtime", "selftime", "bytes", "cumbytes", by
+            )
+        ]
+        for name, stat in stats:
+            lines.append(
+                "{calls:>8} {cumtime:>10.4f} {selftime:>10.4f} {bytes:>12} {cumbytes:>12}  ".format(
+                    **stat
+                )
+                + name
+            )
+        return "\n".join(lines)
+
+    def dump(self, sort="cumtime", limit=None, file=None):
+        file = file if file is not None else sys.stdout
+        print(self.table("types", sort, limit), file=file)
+        print(file=file)
+        print(self.table("hashfuncs", sort, limit), file=file)
+        print(file=file)
+        print("total bytes: {}".format(self.total_bytes), file=file)
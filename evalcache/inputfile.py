@@ -0,0 +1,126 @@
+import os
+import hashlib
+
+from evalcache.lazy import hashfuncs, updatehash_str
+from evalcache.dircache_v2 import DirCache_v2
+
+# Size of chunks (in bytes) for file content reading.
+READ_CHUNK = 1 << 20
+
+_digest_cache = None
+_digest_memo = {}
+_dir_digest_caches = {}
+
+
+def default_digest_cache_path(cache):
+    """Path of digests storage next to directory cache or None"""
+    dirpath = getattr(cache, "dirpath", None)
+    if dirpath is None:
+        return None
+    return os.path.normpath(dirpath) + ".inputfile"
+
+
+def set_digest_cache(cache):
+    """Set dict-like storage of file content digests (f.e. dict or DirCache_v2).
+
+    By default, digests are stored in DirCache_v2 next to the directory cache
+    of the lazifier (see default_digest_cache_path). For other caches they
+    are kept in memory only.
+    """
+    global _digest_cache
+    _digest_cache = cache
+    _digest_memo.clear()
+
+
+def digest_cache(cache=None):
+    """Storage of digests for lazifier's cache or None"""
+    if _digest_cache is not None:
+        return _digest_cache
+
+    path = default_digest_cache_path(cache)
+    if path is None:
+        return None
+    store = _dir_digest_caches.get(path)
+    if store is None:
+        store = _dir_digest_caches[path] = DirCache_v2(path)
+    return store
+
+
+def stat_key(path):
+    """Key of file state. File is considered unchanged while the key is the same."""
+    st = os.stat(path)
+    ident = "{}:{}:{}:{}".format(st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+    return hashlib.sha256(ident.encode("utf-8")).hexdigest()
+
+
+def content_digest(path):
+    """Read file and compute sha256 digest of its content"""
+    m = hashlib.sha256()
+    buf = bytearray(READ_CHUNK)
+    view = memoryview(buf)
+    with open(path, "rb", buffering=0) as fl:
+        while True:
+            n = fl.readinto(buf)
+            if not n:
+                break
+            m.update(view[:n])
+    return m.digest()
+
+
+def file_digest(path, cache=None):
+    """Get content digest of file.
+
+    Digests are stored by (device, inode, size, mtime_ns), so the file is read
+    only if it was changed since the last digest computation.
+
+    cache -- cache of lazifier, next to which digests are stored (see digest_cache)
+    """
+    key = stat_key(path)
+
+    digest = _digest_memo.get(key)
+    if digest is not None:
+        return digest
+
+    store = digest_cache(cache)
+    if store is not None and key in store:
+        try:
+            digest = store[key]
+        except Exception:
+            digest = None
+
+    if digest is None:
+        digest = content_digest(path)
+        if store is not None:
+            store[key] = digest
+
+    _digest_memo[key] = digest
+    return digest
+
+
+class InputFile(str):
+    """Path of input file for lazy functions.
+
+    It is used as ordinary path string on evaluation, but its hash is
+    the digest of the file content instead of the path.
+    """
+
+    def __new__(cls, path):
+        return str.__new__(cls, os.path.expanduser(os.fspath(path)))
+
+    @property
+    def path(self):
+        return str(self)
+
+    def digest(self, cache=None):
+        return file_digest(self.path, cache)
+
+    def __repr__(self):
+        return "InputFile({})".format(str.__repr__(self))
+
+
+def updatehash_InputFile(m, obj, lobj):
+    updatehash_str(m, "<inputfile>", lobj)
+    m.update(obj.digest(lobj.__lazybase__.cache if lobj is not None else None))
+
+
+hashfuncs[InputFile] = updatehash_InputFile
@@ -12,8 +12,17 @@ import functools
 import traceback
 import math
 import time
+import os
+import weakref
+import threading
+import collections
+import pickle
+import concurrent.futures
 
 import evalcache.dircache_v2
+from evalcache.hashprofiler import HashProfiler, ProfilingHash, function_name
+from evalcache.retention import ValueRetention
+from evalcache.progress import Progress
 
 
 class Lazy:
@@ -21,9 +30,24 @@ class Lazy:
 
 	Hash algorithm parameters:
 	--------------------------
-	algo -- hashing algorithm for keys making. (hashlib-like)
+	algo -- hashing algorithm for keys making. (hashlib-like or name from hash_algorithms table)
+	key_namespace -- suffix of cache keys. Keys of different namespaces never collide in 
+		the same cache. By default it is derived from the algorithm (see algorithm_namespace),
+		so an algorithm has the same keys, whether it is passed by name or as callable.
+		Empty string disables the suffix.
 	function_dump -- use code dump for function hashing
 	function_file -- use file path as part of function hash (file pathes incompatible with pyinstaller) 
+	immutable_types -- tuple of types, which objects are never changed. Digests of such arguments 
+		are memoized by object identity and reused as subdigest in parent hashes.
+	immutable_memo_size -- number of last used digests of immutable arguments, which are kept.
+	pickle_hash -- hash objects without own __repr__ by their pickled state instead of 
+		representation with address. Pickled state of some objects (f.e. sets of strings) 
+		differs between processes, so such objects are still reported (see pedantic).
+	deferred_hash -- compute hashes of nonendpoint lazy objects on first access instead of creation 
+		time. Arguments must not be changed until the hash is computed.
+	interning -- creation of nonendpoint lazy object, which hash and options are equal to 
+		a live object, returns the live object. Equal subexpressions share one node and 
+		its value. Hashes are computed at creation time in this mode.
 
 	Cache and evaluation policy arguments:
 	--------------------------------------
@@ -31,6 +55,30 @@ class Lazy:
 	encache -- default state of enabling cache storing
 	decache -- default state of enabling cache loading
 	fastdo -- evaluate or load lazy object`s value immediately after creation
+	prune -- drop generic and arguments of lazy objects, which values are known. Upstream 
+		objects and their values are released, if they aren't used elsewhere.
+	release_values -- iterative evaluator drops stored values of intermediate objects,
+		when all their consumers in the evaluated tree are done. Values are reloaded 
+		from cache on next use. It requires iterative option and can't be used 
+		with recursive, parallel or asyncio evaluation.
+	value_memory_budget -- approximate size in bytes of evaluated values, which are kept 
+		in memory if they can be reloaded from cache. Least recently used values over 
+		the budget are dropped and reloaded on next use (see retention.py).
+	registry_size -- number of last created lazy objects, which are held by the objects 
+		registry (see objects_startswith) with strong references. Other objects are 
+		registered weakly and are released with their last user reference. 
+		None holds all objects.
+	iterative -- use explicit stack evaluator (see engine.py) instead of recursive unlazy. 
+		It has no depth limit for lazy trees.
+	workers -- number of threads for parallel evaluation of independent subtrees (see parallel.py)
+	prefetch -- number of I/O threads, which load stored values of evaluated tree 
+		ahead of evaluation (see prefetch.py)
+	prefetch_limit -- maximal number of values, which are loaded ahead and not used yet
+	record_costs -- measure durations of evaluations and loads and store them to 
+		the file next to the directory cache or to the file path, which is the option 
+		value (see costs.py). They are used by evalcache.plan for estimations.
+	admission -- store only values, which are cheaper to load than to evaluate again.
+		True or admission.AdmissionPolicy with thresholds (see admission.py).
 	
 	Expand policy arguments:
 	------------------------
@@ -45,7 +93,7 @@ class Lazy:
 	diag -- cache diagnostic output
 	diag_values -- add values print to cache diagnostic
 	print_invokes -- LazyObject invokes diagnostic output
-	updatehash_profiling -- updatehash diagnostic output
+	updatehash_profiling -- collect aggregated key construction statistic (see hash_profiler)
 	"""
 
 	def __init__(
@@ -68,15 +116,43 @@ class Lazy:
 		onrepr=False,
 		onbool=True,
 		status_notify=False,
-		pedantic=False
+		pedantic=False,
+		immutable_types=(),
+		immutable_memo_size=1024,
+		pickle_hash=False,
+		deferred_hash=False,
+		key_namespace=None,
+		iterative=False,
+		interning=False,
+		registry_size=0,
+		value_memory_budget=None,
+		prune=False,
+		release_values=False,
+		workers=None,
+		prefetch=None,
+		prefetch_limit=64,
+		record_costs=False,
+		admission=None
 	):
+		# Lazifier is pickled as its configuration (see __reduce__).
+		self._config = dict(locals())
+		del self._config["self"]
+
 		if cached is not None:
 			encache = cached
 			decache = cached
 
 		self.pedantic = pedantic
 		self.cache = cache
+		if isinstance(algo, str):
+			if key_namespace is None:
+				key_namespace = hash_algorithms_namespaces.get(algo, algo)
+			algo = hash_algorithms[algo]
+		elif key_namespace is None:
+			key_namespace = algorithm_namespace(algo)
+
 		self.algo = algo
+		self.key_namespace = key_namespace
 		self.encache = encache
 		self.decache = decache
 		self.diag = diag
@@ -92,8 +168,31 @@ class Lazy:
 		self.function_dump = function_dump
 		self.function_file = function_file
 		self.updatehash_profiling = updatehash_profiling
-		self.objects = {}
+		self.hash_profiler = HashProfiler() if updatehash_profiling else None
+		self.objects = {} if registry_size is None else ObjectsRegistry(registry_size)
 		self.status_notify = status_notify
+		self.immutable_types = tuple(immutable_types)
+		self.immutable_memo_size = immutable_memo_size
+		self.pickle_hash = pickle_hash
+		self.argument_digests = collections.OrderedDict()
+		self.argument_digests_lock = threading.Lock()
+		self.deferred_hash = deferred_hash
+		self.interning = interning
+		self.prune = prune
+		self.release_values = release_values
+		if not iterative:
+			check_release_values(self, "recursive")
+		if workers:
+			check_release_values(self, "parallel")
+		self.retention = (
+			ValueRetention(value_memory_budget) if value_memory_budget is not None else None)
+		self.interned = weakref.WeakValueDictionary()
+		self.iterative = iterative
+		self.workers = workers
+		self._executor = None
+		self.prefetch = prefetch
+		self.prefetch_limit = prefetch_limit
+		self._prefetch_executor = None
 
 
 		if self.status_notify:
@@ -110,35 +209,155 @@ class Lazy:
 		if diag_values and not diag:
 			print("WARNING: diag_values is True, but diag is False")
 
+		if admission is True:
+			admission = evalcache.admission.AdmissionPolicy()
+		self.admission = admission or None
+
+		self.costs = None
+		self.record_costs = record_costs
+		if record_costs or self.admission is not None:
+			self.costs = evalcache.costs.Costs.load(evalcache.costs.costs_path(self))
+		if record_costs:
+			evalcache.costs.save_at_exit(self.costs, evalcache.costs.costs_path(self))
+
+	def __reduce__(self):
+		"""Lazifier is rebuilt from its configuration (f.e. in a worker process).
+		Callbacks, registry, memo tables and recorded costs aren't passed."""
+		return (_restore_lazifier, (type(self), self._config))
+
 	def status_notify_enable(self, en):
 		self.status_notify = en
 
 		self.tree_evaluation_toplevel=None
 		self.tree_evaluation_in_progress=False
+		self.progress = Progress()
+		self.progress_enabled = False
 			
-		self.start_tree_evaluation_callback=lambda x: x
-		self.start_node_evaluation_callback=lambda x: x
-		self.fini_node_evaluation_callback=lambda x: x
-		self.fini_tree_evaluation_callback=lambda x: x
+		self.start_tree_evaluation_callback=lambda *args: None
+		self.start_node_evaluation_callback=lambda *args: None
+		self.fini_node_evaluation_callback=lambda *args: None
+		self.fini_tree_evaluation_callback=lambda *args: None
 		
+	def _status_callback(self, callback, progress):
+		"""Callbacks, which are set with progress=True, get progress of the tree 
+		evaluation (see progress.py) after the ordinary arguments. The tree is 
+		planned for progress only if some callback requests it."""
+		if progress:
+			self.progress_enabled = True
+			return lambda *args: callback(*args, self.progress)
+		return callback
+
+	def set_start_tree_evaluation_callback(self, callback, progress=False):
+		self.start_tree_evaluation_callback = self._status_callback(callback, progress)
+
+	def set_start_node_evaluation_callback(self, callback, progress=False):
+		self.start_node_evaluation_callback = self._status_callback(callback, progress)
+
+	def set_fini_tree_evaluation_callback(self, callback, progress=False):
+		self.fini_tree_evaluation_callback = self._status_callback(callback, progress)
+
+	def set_fini_node_evaluation_callback(self, callback, progress=False):
+		self.fini_node_evaluation_callback = self._status_callback(callback, progress)
+
+	def executor(self):
+		"""Thread pool for parallel evaluation. It is created on first use."""
+		if self._executor is None:
+			self._executor = concurrent.futures.ThreadPoolExecutor(self.workers)
+		return self._executor
+
+	def prefetch_executor(self):
+		"""Thread pool for read-ahead of cached values. It is created on first use."""
+		if self._prefetch_executor is None:
+			self._prefetch_executor = concurrent.futures.ThreadPoolExecutor(self.prefetch)
+		return self._prefetch_executor
+
+	def save_costs(self):
+		"""Store recorded costs (see record_costs option), if there are new records. 
+		It is invoked at interpreter exit too."""
+		if self.costs is not None and self.record_costs:
+			self.costs.save(evalcache.costs.costs_path(self))
+
+	def new_hash(self):
+		"""Create hash object for keys making"""
+		if self.hash_profiler is not None:
+			return ProfilingHash(self.algo(), self.hash_profiler)
+		return self.algo()
+
+	def digest_to_key(self, digest):
+		"""Make cache key from lazy object digest"""
+		if self.key_namespace:
+			return digest.hex() + "." + self.key_namespace
+		return digest.hex()
+
+	def argument_digest(self, obj, lobj):
+		"""Get memoized digest of immutable argument.
+
+		Digests are stored by object id in LRU of immutable_memo_size entries. 
+		Stored reference (weak if possible) guards the entry from id reusing 
+		after object destruction. Immutable objects nested in the argument 
+		aren't memoized.
+		"""
+		key = id(obj)
+		with self.argument_digests_lock:
+			entry = self.argument_digests.get(key)
+			if entry is not None and entry[0]() is obj:
+				self.argument_digests.move_to_end(key)
+				return entry[1]
+
+		m = self.new_hash()
+		_argument_memo.nested = True
+		try:
+			updatehash_content(m, obj, lobj)
+		finally:
+			_argument_memo.nested = False
+		digest = m.digest()
 
-	def set_start_tree_evaluation_callback(self, callback):
-		self.start_tree_evaluation_callback = callback
-
-	def set_start_node_evaluation_callback(self, callback):
-		self.start_node_evaluation_callback = callback
-
-	def set_fini_tree_evaluation_callback(self, callback):
-		self.fini_tree_evaluation_callback = callback
-
-	def set_fini_node_evaluation_callback(self, callback):
-		self.fini_node_evaluation_callback = callback
+		try:
+			ref = weakref.ref(obj, lambda ref, key=key: self._forget_argument_digest(key, ref))
+		except TypeError:
+			# Object isn't weakrefable. Hold it while digest is stored.
+			ref = lambda: obj
+
+		with self.argument_digests_lock:
+			self.argument_digests[key] = (ref, digest)
+			while len(self.argument_digests) > self.immutable_memo_size:
+				self.argument_digests.popitem(last=False)
+		return digest
+
+	def _forget_argument_digest(self, key, ref):
+		with self.argument_digests_lock:
+			entry = self.argument_digests.get(key)
+			if entry is not None and entry[0] is ref:
+				del self.argument_digests[key]
+
+	def clean_argument_digests(self):
+		"""Drop memoized digests of immutable arguments"""
+		with self.argument_digests_lock:
+			self.argument_digests.clear()
 
 	def _register(self, obj):
 		"""Index lazyobject created by this lazifier"""
 
 		self.objects[obj.__lazyhexhash__] = obj
 
+	def intern(self, obj):
+		"""Get live lazy object equal to obj (see interning option).
+		obj is interned if there is no such object."""
+		if not self.interning or obj.generic is None:
+			return obj
+
+		key = obj.__lazyhexhash__
+		existing = self.interned.get(key)
+		if existing is None:
+			self.interned[key] = obj
+			return obj
+
+		if existing is obj or not _interchangeable(existing, obj):
+			return obj
+
+		self.objects[key] = existing
+		return existing
+
 	def cache_startswith(self, hash):
 		"""Найти в кеше все объекты, начинающиеся с определенного префикса"""
 
@@ -153,11 +372,10 @@ class Lazy:
 		"""Найти среди зарегистрированных в скрипте ленивых объектов, 
 		начинающиеся с определенного префикса"""
 	   
-		lst = [k for k in self.objects.keys()]
 		ret = []
-		for l in lst:
-			if l.startswith(hash):
-				ret.append(self.objects[l])
+		for k, obj in list(self.objects.items()):
+			if k.startswith(hash):
+				ret.append(obj)
 		return ret
 
 	def __getitem__(self, hash):
@@ -232,6 +450,81 @@ class Lazy:
 		)
 
 
+# Named hash algorithms for Lazy algo option.
+hash_algorithms = {
+	"sha256": hashlib.sha256,
+	"sha512": hashlib.sha512,
+	"md5": hashlib.md5,
+	"blake2b": hashlib.blake2b,
+	"blake2s": hashlib.blake2s,
+	"blake2b-128": functools.partial(hashlib.blake2b, digest_size=16),
+	"blake2b-64": functools.partial(hashlib.blake2b, digest_size=8),
+}
+
+# Key namespaces of named algorithms. sha256 is default algorithm, 
+# so its keys are left without namespace for compatibility.
+hash_algorithms_namespaces = {
+	"sha256": None,
+}
+
+
+def algorithm_namespace(algo):
+	"""Key namespace of hashlib-like algorithm.
+
+	It is the hasher name, with digest size in bits if the size isn't 
+	the default one for the name (f.e. "sha512", "blake2b-128"). So it is 
+	equal to the name of the same algorithm in hash_algorithms table.
+	"""
+	hasher = algo()
+	name = getattr(hasher, "name", None)
+	if not isinstance(name, str):
+		name = getattr(algo, "__qualname__", None) or type(hasher).__qualname__
+	size = hasher.digest_size
+
+	try:
+		default_size = hashlib.new(name).digest_size
+	except (ValueError, TypeError):
+		default_size = None
+
+	if size != default_size:
+		name = "{}-{}".format(name, size * 8)
+	return hash_algorithms_namespaces.get(name, name)
+
+
+class ObjectsRegistry(weakref.WeakValueDictionary):
+	"""Weak-valued registry of lazy objects.
+
+	size last registered objects are also held by strong references.
+	"""
+
+	def __init__(self, size=0):
+		weakref.WeakValueDictionary.__init__(self)
+		self.size = size
+		self.recent = collections.OrderedDict()
+
+	def __setitem__(self, key, obj):
+		weakref.WeakValueDictionary.__setitem__(self, key, obj)
+		if self.size:
+			self.recent[key] = obj
+			self.recent.move_to_end(key)
+			if len(self.recent) > self.size:
+				self.recent.popitem(last=False)
+
+	def __delitem__(self, key):
+		weakref.WeakValueDictionary.__delitem__(self, key)
+		self.recent.pop(key, None)
+
+	def clear(self):
+		weakref.WeakValueDictionary.clear(self)
+		self.recent.clear()
+
+
+def _restore_lazifier(cls, config):
+	lazifier = cls.__new__(cls)
+	Lazy.__init__(lazifier, **config)
+	return lazifier
+
+
 class LazyHash(Lazy):
 	"""Этот декоратор не использует кэш. Создаёт ленивые объекты, вычисляемые один раз."""
 
@@ -252,13 +545,28 @@ class Memoize(Lazy):
 		Lazy.__init__(self, cache={}, onplace=onplace, onuse=True, **kwargs)
 
 
+def _interchangeable(a, b):
+	return (
+		type(a) is type(b)
+		and a.__encache__ == b.__encache__
+		and a.__decache__ == b.__decache__
+		and a.__unlazyonuse__ == b.__unlazyonuse__
+		and a.__lazy_unwrap_prevent_list__ == b.__lazy_unwrap_prevent_list__
+		and a.__lazy_unwrap_prevent_list_in_child__ == b.__lazy_unwrap_prevent_list_in_child__
+	)
+
+
 class MetaLazyObject(type):
-	"""LazyObject has metaclass for creation control. It uses for onplace expand option supporting"""
+	"""LazyObject has metaclass for creation control. 
+	It uses for onplace expand option and interning supporting"""
 
 	def __call__(cls, lazifier, *args, onplace=None, **kwargs):
 		obj = cls.__new__(cls)
 		cls.__init__(obj, lazifier, *args, **kwargs)
 
+		if lazifier.interning and not kwargs.get("transparent"):
+			obj = lazifier.intern(obj)
+
 		if onplace is None:
 			onplace = lazifier.onplace
 
@@ -268,6 +576,27 @@ class MetaLazyObject(type):
 			return obj
 
 
+# Bits of LazyObject.__lazyflags__
+ENCACHE_FLAG = 1
+DECACHE_FLAG = 2
+ONUSE_FLAG = 4
+HEAP_FLAG = 8
+PRUNED_FLAG = 16
+
+
+def _flag_property(bit, doc):
+	def get(self):
+		return bool(self.__lazyflags__ & bit)
+
+	def set(self, en):
+		if en:
+			self.__lazyflags__ |= bit
+		else:
+			self.__lazyflags__ &= ~bit
+
+	return property(get, set, doc=doc)
+
+
 class LazyObject(object, metaclass=MetaLazyObject):
 	"""Lazytree element's interface.
 
@@ -282,6 +611,14 @@ class LazyObject(object, metaclass=MetaLazyObject):
 	-------
 	MetaLazyObject used as metaclass for support onplace expand logic.
 
+	Lazy objects are slotted. Boolean options are packed to __lazyflags__.
+	The digest is the identity of the object: it is hashed into parent digests 
+	and used by __hash__. The key (__lazyhexhash__) is derived from it on first 
+	access and kept in __lazyhexkey__, because evaluators, planners and tree 
+	walks read keys many times per object (cache probes, visited sets), and 
+	derivation allocates a new string every time. Both are reset together.
+	Subclasses without __slots__ have the instance dictionary as usual.
+
 	Arguments:
 	----------
 	lazifier -- parental lazy decorator
@@ -318,12 +655,19 @@ class LazyObject(object, metaclass=MetaLazyObject):
 		if kwargs is None:
 			kwargs = {}
 
+		encache = encache if encache is not None else lazifier.encache
+		decache = decache if decache is not None else lazifier.decache
+		onuse = onuse if onuse is not None else lazifier.onuse
+
 		self.__lazybase__ = lazifier
-		self.__encache__ = encache if encache is not None else self.__lazybase__.encache
-		self.__decache__ = decache if decache is not None else self.__lazybase__.decache
-		self.__unlazyonuse__ = onuse if onuse is not None else self.__lazybase__.onuse
+		self.__lazyflags__ = (
+			(ENCACHE_FLAG if encache else 0)
+			| (DECACHE_FLAG if decache else 0)
+			| (ONUSE_FLAG if onuse else 0)
+			| (HEAP_FLAG if value is not None else 0))
 		self.__lazyhint__ = hint
-		self.__lazyheap__ = value is not None
+		self.__lazydigest__ = None
+		self.__lazyhexkey__ = None
 
 		self.generic = generic
 		self.args = args
@@ -333,32 +677,86 @@ class LazyObject(object, metaclass=MetaLazyObject):
 		self.__lazy_unwrap_prevent_list_in_child__ = prevent_unwrap_in_child
 
 		if not transparent:
-			m = lazifier.algo()
-			if generic is not None:
-				updatehash(m, generic, self)
-			if len(args):
-				updatehash(m, args, self)
-			if len(kwargs):
-				updatehash(m, kwargs, self)
-			if value is not None:
-				updatehash(m, value, self)
-			if hint is not None:
-				updatehash(m, hint, self)
-	
-			self.__lazyhash__ = m.digest()
-			self.__lazyhexhash__ = m.hexdigest()
+			if value is None and lazifier.deferred_hash and not lazifier.interning:
+				# Hash will be computed on first access (see __lazyhash__).
+				pass
+			else:
+				self.__lazy_make_hash__(value)
 		else:
 			m = lazifier.algo()
-			self.__lazyhash__ = m.digest()
-			self.__lazyhexhash__ = m.hexdigest()
+			self.__lazydigest__ = m.digest()
 			self.__encache__ = False
 			self.__decache__ = False
-
-		self.__lazybase__._register(self)
+			self.__lazybase__._register(self)
 
 		if self.__lazybase__.fastdo and self.__lazyvalue__ is None:
 			if not prevent_fastdo:
-				unlazy(self)
+				unlazy(self if transparent else self.__lazybase__.intern(self))
+
+	__slots__ = (
+		"__lazybase__",
+		"__lazyflags__",
+		"__lazydigest__",
+		# Key derived from the digest (see class docstring).
+		"__lazyhexkey__",
+		"__lazyhint__",
+		"__lazyvalue__",
+		"__lazy_unwrap_prevent_list__",
+		"__lazy_unwrap_prevent_list_in_child__",
+		"generic",
+		"args",
+		"kwargs",
+		"__weakref__",
+	)
+
+	__encache__ = _flag_property(ENCACHE_FLAG, "store value to cache")
+	__decache__ = _flag_property(DECACHE_FLAG, "load value from cache")
+	__unlazyonuse__ = _flag_property(ONUSE_FLAG, "expand on use")
+	__lazyheap__ = _flag_property(HEAP_FLAG, "value is known")
+	__lazypruned__ = _flag_property(PRUNED_FLAG, "generic and arguments are dropped")
+
+	@property
+	def __lazyhash__(self):
+		"""Digest of lazy object. It is computed on first access for deferred hashes."""
+		digest = self.__lazydigest__
+		if digest is None:
+			make_deferred_hashes(self)
+			digest = self.__lazydigest__
+		return digest
+
+	@property
+	def __lazyhexhash__(self):
+		"""Cache key of lazy object. It is computed once from the digest."""
+		key = self.__lazyhexkey__
+		if key is None:
+			key = self.__lazyhexkey__ = self.__lazybase__.digest_to_key(self.__lazyhash__)
+		return key
+
+	def __lazy_hash_known__(self):
+		"""True if the hash is already computed"""
+		return self.__lazydigest__ is not None
+
+	def __lazy_make_hash__(self, value=None):
+		"""Compute and register object's hash.
+
+		value -- endpoint value. It is passed explicitly, because __lazyvalue__ 
+			of nonendpoint objects is changed on evaluation.
+		"""
+		m = self.__lazybase__.new_hash()
+		if self.generic is not None:
+			updatehash(m, self.generic, self)
+		if len(self.args):
+			updatehash_arguments(m, self.args, self)
+		if len(self.kwargs):
+			updatehash_arguments(m, self.kwargs, self)
+		if value is not None:
+			updatehash(m, value, self)
+		if self.__lazyhint__ is not None:
+			updatehash(m, self.__lazyhint__, self)
+
+		self.__lazydigest__ = m.digest()
+		self.__lazyhexkey__ = None
+		self.__lazybase__._register(self)
 
 	# Callable
 	def __call__(self, *args, **kwargs):
@@ -567,7 +965,7 @@ class LazyObject(object, metaclass=MetaLazyObject):
 	def __delete__(self):
 		pass
 
-	def unlazy(self, debug=False):
+	def unlazy(self, debug=False, executor=None):
 		"""Get a result of evaluation.
 
 		See .unlazy function for details.
@@ -576,7 +974,7 @@ class LazyObject(object, metaclass=MetaLazyObject):
 		Technically, the evaluated object can define an "unlazy" method.
 		If so, we'll hide such the method. However since using the unlazy 
 		function is more convenient as the method, so this option was excluded."""
-		ret = unlazy(self, debug)
+		ret = unlazy(self, debug, executor)
 		if hasattr(ret, "unlazy"):
 			print("WARNING: Shadow unlazy method.")
 		return ret
@@ -629,6 +1027,12 @@ def expand_args_kwargs(obj, func, debug = False):
 	if debug:
 		print("\texpand kwargs:", kwargs)
 
+	restore_prevented_arguments(obj, func, args, kwargs)
+	return args, kwargs
+
+
+def restore_prevented_arguments(obj, func, args, kwargs):
+	"""Return lazy objects to expanded arguments listed in prevent_unwrap"""
 	if obj.__lazy_unwrap_prevent_list__ is not None:
 		for name in obj.__lazy_unwrap_prevent_list__:
 			argno = evalcache.funcarg.argument_number(name, func)
@@ -641,8 +1045,6 @@ def expand_args_kwargs(obj, func, debug = False):
 				kwargs[name] = obj.kwargs[name]
 				continue
 
-	return args, kwargs
-
 
 def lazydo(obj, debug=False):
 	"""Perform evaluation.
@@ -650,6 +1052,8 @@ def lazydo(obj, debug=False):
 	We need expand all arguments and callable for support lazy trees.
 	Such we should expand result becourse it can be LazyObject (f.e. lazy functions in lazy functions)
 	"""
+	check_evaluable(obj)
+
 	if debug:
 		print("__lazydo__")
 		print("\tobj.generic:", obj.generic)
@@ -662,29 +1066,49 @@ def lazydo(obj, debug=False):
 	
 	args, kwargs = expand_args_kwargs(obj, func, debug)
 
-	result = expand(func(*args, **kwargs))
+	costs = obj.__lazybase__.costs
+	if costs is None:
+		result = expand(func(*args, **kwargs))
+	else:
+		start = time.perf_counter()
+		result = func(*args, **kwargs)
+		elapsed = time.perf_counter() - start
+		result = expand(result)
+		costs.record_eval(obj, elapsed, result)
+
 	if debug:
 		print("\texpand result:", result)
 	return result
 
 
-def unlazy(obj, debug=False):
+def unlazy(obj, debug=False, executor=None):
 	"""Get a result of evaluation.
 
 	This function searches for the result in local memory, and after that in cache.
 	If object wasn't stored early, it performs evaluation and stores a result in cache and local memory.
 	If object has disabled __encache__ storing prevented.
 	If object has disabled __decache__ loading prevented.
+	If executor (concurrent.futures) is set, independent subtrees are evaluated in parallel (see parallel.py).
 	"""
+	# Known values (f.e. endpoints) are taken without the executor.
+	if (executor is None and obj.__lazybase__.workers and not obj.__lazyheap__
+			and not evalcache.parallel.in_worker()):
+		executor = obj.__lazybase__.executor()
+
+	if executor is not None and not debug and not obj.__lazyheap__:
+		return evalcache.parallel.evaluate(obj, executor)
+
+	if obj.__lazybase__.iterative and not debug:
+		return evalcache.engine.evaluate(obj)
+
+	# Top level object plans its tree, probes and loads stored values by batches.
+	prefetch = evalcache.prefetch.active()
+	if (prefetch is None and not obj.__lazyheap__ 
+			and obj.__lazybase__.cache is not None):
+		return evalcache.prefetch.unlazy(obj, debug)
+
 	if obj.__lazybase__.status_notify:
-		if obj.__lazybase__.tree_evaluation_in_progress is False:
-			obj.__lazybase__.tree_evaluation_toplevel = obj
-			obj.__lazybase__.tree_evaluation_in_progress = True
-			obj.__lazybase__.start_tree_evaluation_callback(obj)
-		
-		obj.__lazybase__.start_node_evaluation_callback(
-			obj.__lazybase__.tree_evaluation_toplevel, 
-			obj)
+		notify_start_node(obj, prefetch.plan if prefetch is not None else None)
 			
 	if debug:
 		print("unlazy")
@@ -694,7 +1118,7 @@ def unlazy(obj, debug=False):
 	# If local context was setted we can return object imediately
 	if obj.__lazyheap__:
 		# Load from local context ...
-		if obj.generic is None:
+		if is_trivial(obj):
 			# for endpoint object.
 			msg = "endp"
 		else:
@@ -702,21 +1126,24 @@ def unlazy(obj, debug=False):
 			msg = "fget"
 
 	# Otherwise try searhes object in cache, if not prevented.
-	elif obj.__decache__ and obj.__lazyhexhash__ in obj.__lazybase__.cache:
+	elif obj.__decache__ and evalcache.engine.stored(obj, prefetch):
 		# Load from cache.
 		msg = "load"
 		try:
 			# Try to load object value. Save in local context if success.
-			value = obj.__lazybase__.cache[obj.__lazyhexhash__]
+			if (prefetch is not None and prefetch.cache is obj.__lazybase__.cache 
+					and obj.__lazyhexhash__ in prefetch.values):
+				value = prefetch.values.pop(obj.__lazyhexhash__)
+			elif obj.__lazybase__.costs is not None:
+				start = time.perf_counter()
+				value = obj.__lazybase__.cache[obj.__lazyhexhash__]
+				obj.__lazybase__.costs.record_load(obj, time.perf_counter() - start, value)
+			else:
+				value = obj.__lazybase__.cache[obj.__lazyhexhash__]
 			set_lazyvalue(obj, value)
 		except:
-			print(
-				"Warning: Incostistent pickling. Remove it from cache and reevaluate."
-			)
-			msg = "fail"
-
 			# Clean broken object from cache
-			del obj.__lazybase__.cache[obj.__lazyhexhash__]
+			msg = broken_entry(obj.__lazybase__.cache, obj.__lazyhexhash__)
 
 			# Try to reevaluate object. Save in local context if success.
 			value = lazydo(obj, debug)
@@ -732,31 +1159,131 @@ def unlazy(obj, debug=False):
 		set_lazyvalue(obj, value)
 		
 		# And store in cache if not prevented. 
-		if obj.__encache__:
+		if obj.__encache__ and admitted(obj, value):
 			# with storing.
 			msg = "save"
 			obj.__lazybase__.cache[obj.__lazyhexhash__] = obj.__lazyvalue__
+			if prefetch is not None:
+				prefetch.absent.discard(obj.__lazyhexhash__)
+		elif obj.__encache__:
+			# storing is rejected by admission policy.
+			msg = "skip"
 		else:
 			# without storing.
 			msg = "eval"
 
+	value = obj.__lazyvalue__
+	value_known(obj, msg)
+
 	if obj.__lazybase__.diag:
-		if obj.__lazybase__.diag_values:
-			print(msg, obj.__lazyhexhash__[:20] + "...", obj.__lazyvalue__)
-		else:
-			print(msg, obj.__lazyhexhash__[:20] + "...")
+		print_diag(obj, msg)
 
 	if obj.__lazybase__.status_notify:
-		obj.__lazybase__.fini_node_evaluation_callback(
-			obj.__lazybase__.tree_evaluation_toplevel,
-			obj)
-		
-		if obj.__lazybase__.tree_evaluation_toplevel is obj:
-			obj.__lazybase__.tree_evaluation_in_progress = False
-			obj.__lazybase__.fini_tree_evaluation_callback(obj)
+		notify_fini_node(obj)
 		
 	# And, anyway, here our object in obj.__lazyvalue__
-	return obj.__lazyvalue__
+	return value
+
+
+def value_known(obj, msg):
+	"""Invoked when value of lazy object becomes known (msg is the diagnostic message).
+	Account the value in memory budget (see value_memory_budget option) and 
+	prune the object (see prune option)."""
+	lazifier = obj.__lazybase__
+	if lazifier.retention is not None:
+		lazifier.retention.update(obj, msg)
+	if lazifier.prune and obj.__lazyheap__ and obj.generic is not None:
+		prune_inputs(obj)
+
+
+def admitted(obj, value):
+	"""True if admission policy (see admission option) allows to store 
+	the evaluated value of obj"""
+	lazifier = obj.__lazybase__
+	if lazifier.admission is None:
+		return True
+	return lazifier.admission.admit(obj, value, lazifier.costs)
+
+
+def broken_entry(cache, key, lock=None):
+	"""Report cache entry, which can't be loaded, and remove it from cache
+	(if cache isn't None). Return diagnostic message of reevaluation."""
+	print("Warning: Inconsistent pickling. Remove it from cache and reevaluate.")
+	if cache is not None:
+		try:
+			if lock is None:
+				del cache[key]
+			else:
+				with lock:
+					del cache[key]
+		except KeyError:
+			# Already removed (f.e. by another thread).
+			pass
+	return "fail"
+
+
+def check_release_values(lazifier, evaluator):
+	"""Raise error if release_values option is set for evaluator, 
+	which doesn't support it"""
+	if lazifier.release_values:
+		raise ValueError(
+			"release_values option is supported by the iterative evaluator only, "
+			"not by {} evaluation".format(evaluator))
+
+
+def check_evaluable(obj):
+	if obj.__lazypruned__:
+		raise Exception(
+			"Lazy object {} is pruned and its value isn't known or stored in cache.".format(
+				obj.__lazyhexhash__))
+
+
+def prune_inputs(obj):
+	"""Drop references to generic and arguments of evaluated lazy object.
+	Only the digest and the value are kept."""
+	if not obj.__lazy_hash_known__():
+		obj.__lazy_make_hash__()
+	obj.generic = None
+	obj.args = ()
+	obj.kwargs = {}
+	obj.__lazy_unwrap_prevent_list__ = None
+	obj.__lazypruned__ = True
+
+
+def notify_start_node(obj, plan=None):
+	"""Invoke status callbacks before node evaluation.
+
+	plan -- engine.Plan of the tree, if the evaluator has it already.
+	"""
+	if obj.__lazybase__.tree_evaluation_in_progress is False:
+		obj.__lazybase__.tree_evaluation_toplevel = obj
+		obj.__lazybase__.tree_evaluation_in_progress = True
+		if obj.__lazybase__.progress_enabled:
+			obj.__lazybase__.progress.start(obj, plan)
+		obj.__lazybase__.start_tree_evaluation_callback(obj)
+	
+	obj.__lazybase__.start_node_evaluation_callback(
+		obj.__lazybase__.tree_evaluation_toplevel, 
+		obj)
+
+
+def notify_fini_node(obj):
+	"""Invoke status callbacks after node evaluation"""
+	obj.__lazybase__.progress.node_done(obj)
+	obj.__lazybase__.fini_node_evaluation_callback(
+		obj.__lazybase__.tree_evaluation_toplevel,
+		obj)
+	
+	if obj.__lazybase__.tree_evaluation_toplevel is obj:
+		obj.__lazybase__.tree_evaluation_in_progress = False
+		obj.__lazybase__.fini_tree_evaluation_callback(obj)
+
+
+def print_diag(obj, msg):
+	if obj.__lazybase__.diag_values:
+		print(msg, obj.__lazyhexhash__[:20] + "...", obj.__lazyvalue__)
+	else:
+		print(msg, obj.__lazyhexhash__[:20] + "...")
 
 
 def unlazy_if_need(arg):
@@ -795,6 +1322,32 @@ def updatehash_str(m, obj, lobj):
 	m.update(obj.encode("utf-8"))
 
 
+# Size of chunks (in bytes) for large buffers hashing.
+BUFFER_HASH_CHUNK = 1 << 20
+
+
+def updatehash_buffer(m, obj, lobj):
+	"""Hash bytes-like object without representation making.
+
+	C-contiguous buffers are passed to hash object by zero-copy slices.
+	Other buffers are copied by chunks along the first dimension.
+	"""
+	mv = memoryview(obj)
+	updatehash_str(m, "<buffer:{}:{}>".format(mv.format, mv.shape), lobj)
+
+	if mv.c_contiguous:
+		flat = mv.cast("B") if mv.ndim != 1 or mv.format != "B" else mv
+		for start in range(0, flat.nbytes, BUFFER_HASH_CHUNK):
+			m.update(flat[start:start + BUFFER_HASH_CHUNK])
+	elif mv.ndim == 0 or mv.nbytes == 0:
+		m.update(mv.tobytes())
+	else:
+		rowbytes = mv.nbytes // mv.shape[0]
+		rows = max(1, BUFFER_HASH_CHUNK // rowbytes)
+		for start in range(0, mv.shape[0], rows):
+			m.update(mv[start:start + rows].tobytes())
+
+
 def updatehash_LazyObject(m, obj, lobj):
 	m.update(obj.__lazyhash__)
 
@@ -803,6 +1356,50 @@ def updatehash_NoExpand(m, obj, lobj):
 	pass
 
 
+# Function sources cache: id(code) -> (weakref to code, file mtime, encoded source)
+_function_sources = {}
+
+
+def _forget_function_source(key, ref):
+	entry = _function_sources.get(key)
+	if entry is not None and entry[0] is ref:
+		del _function_sources[key]
+
+
+def function_source(obj):
+	"""Get encoded source of function or None if it isn't available.
+
+	Source is inspected once per code object and reinspected only 
+	if the modification time of the function's file was changed.
+	"""
+	target = inspect.unwrap(obj)
+	code = getattr(target, "__code__", None)
+	if code is None:
+		try:
+			return inspect.getsource(obj).encode("utf-8")
+		except Exception:
+			return None
+
+	try:
+		mtime = os.stat(code.co_filename).st_mtime_ns
+	except (OSError, ValueError):
+		mtime = None
+
+	key = id(code)
+	entry = _function_sources.get(key)
+	if entry is not None and entry[0]() is code and entry[1] == mtime:
+		return entry[2]
+
+	try:
+		source = inspect.getsource(obj).encode("utf-8")
+	except Exception:
+		source = None
+
+	ref = weakref.ref(code, lambda ref, key=key: _forget_function_source(key, ref))
+	_function_sources[key] = (ref, mtime, source)
+	return source
+
+
 def updatehash_function(m, obj, lobj):
 	if hasattr(obj, "__qualname__"):
 		if (
@@ -819,10 +1416,9 @@ def updatehash_function(m, obj, lobj):
 
 	if lobj.__lazybase__.function_dump:
 		# Pass inspection if sources is not available.
-		try:
-			updatehash_str(m, inspect.getsource(obj), lobj)
-		except:
-			pass
+		source = function_source(obj)
+		if source is not None:
+			m.update(source)
 
 	if hasattr(obj, "__module__") and obj.__module__:
 		updatehash_str(m, obj.__module__, lobj)
@@ -842,11 +1438,80 @@ def updatehash_instancemethod(m, obj, lobj):
 			updatehash_str(m, sys.modules[obj.__module__].__file__, lobj)
 
 
+class HashfuncsTable(dict):
+	"""Table of hash functions with memoized type dispatch.
+
+	Keys are types or class names. Function for concrete type is resolved 
+	once by its __mro__ and stored in dispatch cache. Any table modification
+	invalidates the dispatch cache. Classes, which define __evalcache_hash__(m) 
+	method, are hashed by this method.
+	"""
+
+	def __init__(self, *args, **kwargs):
+		dict.__init__(self, *args, **kwargs)
+		self._dispatch = {}
+
+	def __setitem__(self, key, value):
+		dict.__setitem__(self, key, value)
+		self._dispatch.clear()
+
+	def __delitem__(self, key):
+		dict.__delitem__(self, key)
+		self._dispatch.clear()
+
+	def update(self, *args, **kwargs):
+		dict.update(self, *args, **kwargs)
+		self._dispatch.clear()
+
+	def setdefault(self, key, default=None):
+		self._dispatch.clear()
+		return dict.setdefault(self, key, default)
+
+	def pop(self, *args):
+		self._dispatch.clear()
+		return dict.pop(self, *args)
+
+	def popitem(self):
+		self._dispatch.clear()
+		return dict.popitem(self)
+
+	def clear(self):
+		dict.clear(self)
+		self._dispatch.clear()
+
+	def resolve(self, cls):
+		"""Find hash function for type without dispatch cache using."""
+		for base in cls.__mro__:
+			if base in self:
+				return dict.__getitem__(self, base)
+			if "__evalcache_hash__" in base.__dict__:
+				return updatehash_protocol
+
+		# Virtual subclasses (abc.register) are not present in __mro__.
+		for key, func in self.items():
+			if isinstance(key, type) and issubclass(cls, key):
+				return func
+
+		return self.get(cls.__name__)
+
+	def dispatch(self, cls):
+		"""Get hash function for type. Return None if type hasn't special function."""
+		try:
+			return self._dispatch[cls]
+		except KeyError:
+			func = self.resolve(cls)
+			self._dispatch[cls] = func
+			return func
+
+
 # Table of hash functions for special types.
-hashfuncs = {
+hashfuncs = HashfuncsTable({
 	LazyObject: updatehash_LazyObject,
 	NoExpand: updatehash_NoExpand,
 	str: updatehash_str,
+	bytes: updatehash_buffer,
+	bytearray: updatehash_buffer,
+	memoryview: updatehash_buffer,
 	tuple: updatehash_list,
 	list: updatehash_list,
 	dict: updatehash_dict,
@@ -854,52 +1519,124 @@ hashfuncs = {
 	"instancemethod": updatehash_instancemethod,
 	# types.BuiltinFunctionType: updatehash_function,
 	# types.BuiltinMethodType: updatehash_function,
-}
+})
 
 try:
 	import numpy
 
+	# Version marker of ndarray key format. Change it if hashing scheme changed,
+	# so keys of early versions will not be reused.
+	NDARRAY_HASH_VERSION = "<ndarray:2>"
+
+	# Size of chunks (in elements) for noncontiguous arrays hashing.
+	NDARRAY_HASH_BUFSIZE = 1 << 16
+
 	def updatehash_ndarray(m, obj, lobj):
-		return updatehash_list(m,obj,lobj)
+		"""Hash ndarray as dtype, shape and raw data in C order.
+
+		Contiguous arrays are passed to hash object without copying.
+		Noncontiguous views are hashed by chunks, so the base array isn't copied.
+		Memory layout (strides) doesn't take part in the hash, so a view and its 
+		copy have the same key.
+		"""
+		updatehash_str(m, NDARRAY_HASH_VERSION, lobj)
+		updatehash_str(m, obj.dtype.str, lobj)
+		updatehash_str(m, repr(obj.shape), lobj)
+		updatehash_str(m, "C", lobj)
+
+		if obj.dtype.hasobject:
+			# Objects haven't stable binary presentation.
+			return updatehash_list(m, obj.reshape(-1), lobj)
+
+		if obj.flags.c_contiguous:
+			m.update(memoryview(obj.reshape(-1).view(numpy.uint8)))
+			return
+
+		it = numpy.nditer(obj, 
+			flags=["external_loop", "buffered", "zerosize_ok"], 
+			order="C", 
+			buffersize=NDARRAY_HASH_BUFSIZE)
+		for chunk in it:
+			chunk = numpy.ascontiguousarray(chunk)
+			m.update(memoryview(chunk.view(numpy.uint8)))
 
 	hashfuncs[numpy.ndarray] = updatehash_ndarray
 
-except:
+except ImportError:
 	pass
 
-def updatehash(m, obj, lobj):
-	"""Update hash in hashlib-like algo with hashable object
+# Digest of memoized immutable argument is being computed in this thread.
+_argument_memo = threading.local()
 
-	As usual we use hash of object representation, but for special types we can set
-	special updatehash functions (see 'hashfuncs' table).
 
-	Warn: If you use changing between program starts object representation (f.e. object.__repr__)
-	for hashing, this library will not be work corectly. 
+def _lazyobject_reference(hexhash):
+	"""Stub. Presents lazy objects in pickle stream of updatehash_pickle."""
 
-	Arguments
-	---------
-	m -- hashlib-like algorithm instance.
-	obj -- hashable object
+
+class HashWriter:
+	"""File-like adapter, which passes written data to hashlib-like object"""
+
+	def __init__(self, m):
+		self.m = m
+
+	def write(self, data):
+		self.m.update(data)
+		return len(data)
+
+
+class HashPickler(pickle.Pickler):
+	"""Pickler, which streams object state into hashlib-like object.
+
+	Pickle protocol 5 out-of-band buffers (f.e. numpy arrays) are passed 
+	to hash object without copying. Nested lazy objects are presented by their keys.
 	"""
-	if lobj is not None and lobj.__lazybase__.updatehash_profiling:
-		start = time.time()
 
-	updatehash_str(m, repr(obj.__class__), lobj)
+	def __init__(self, m):
+		pickle.Pickler.__init__(
+			self, HashWriter(m), protocol=5, buffer_callback=self.hash_buffer)
+		self.m = m
+
+	def hash_buffer(self, buffer):
+		self.m.update(buffer.raw())
+
+	def reducer_override(self, obj):
+		if isinstance(obj, LazyObject):
+			return (_lazyobject_reference, (obj.__lazyhexhash__,))
+		return NotImplemented
+
+
+def updatehash_pickle(m, obj, lobj):
+	"""Update hash with pickled object state. 
+
+	Uses for objects, which have neither special hash function nor meaningful 
+	representation, if pickle_hash option is set. Pickled state should be 
+	deterministic. Return False if object can't be pickled.
+	"""
+	sub = lobj.__lazybase__.new_hash() if lobj is not None else hashlib.sha256()
+	try:
+		HashPickler(sub).dump(obj)
+	except Exception:
+		return False
+
+	updatehash_str(m, "<pickle>", lobj)
+	m.update(sub.digest())
+	return True
+
+
+def updatehash_protocol(m, obj, lobj):
+	"""Hash object, which implements __evalcache_hash__(m) protocol"""
+	obj.__evalcache_hash__(m)
 
-	def find_class_as_instance(obj):
-		for cls in hashfuncs.keys():
-			if isinstance(cls, type) and isinstance(obj, cls):
-				return cls
-		return None
 
-	asclass = find_class_as_instance(obj)
+def updatehash_content(m, obj, lobj):
+	"""Update hash with object content (without class prefix)"""
+	hashfunc = hashfuncs.dispatch(obj.__class__)
 
-	if asclass is not None:
-		hashfuncs[asclass](m, obj, lobj)
-	elif obj.__class__.__name__ in hashfuncs:
-		hashfuncs[obj.__class__.__name__](m, obj, lobj)
+	if hashfunc is not None:
+		hashfunc(m, obj, lobj)
 	else:
 		if obj.__class__.__repr__ is object.__repr__:
+			# Representation contains object address.
 			if lobj.__lazybase__.pedantic:
 				raise Exception(
 					"evalcache: Object of class {} uses common __repr__ method. Undefined hash function. (repr:{})".format(
@@ -913,11 +1650,63 @@ def updatehash(m, obj, lobj):
 				)
 			if lobj.__lazybase__.diag_warning_backtrace:
 				traceback.print_stack()
+
+			# Try to hash pickled state, if it is allowed.
+			if lobj.__lazybase__.pickle_hash and updatehash_pickle(m, obj, lobj):
+				return
 		updatehash_str(m, repr(obj), lobj)
 
-	if lobj is not None and lobj.__lazybase__.updatehash_profiling:
-		end = time.time()
-		print("updatehash elapse for {}: {}".format(repr(obj), end - start))
+
+def updatehash_arguments(m, obj, lobj):
+	"""Update hash with args or kwargs container.
+
+	Same as updatehash, but container itself is never memoized 
+	as immutable argument (it is new for each call).
+	"""
+	updatehash_str(m, repr(obj.__class__), lobj)
+	updatehash_content(m, obj, lobj)
+
+
+def updatehash(m, obj, lobj):
+	"""Update hash in hashlib-like algo with hashable object
+
+	As usual we use hash of object representation, but for special types we can set
+	special updatehash functions (see 'hashfuncs' table). Objects can stream their 
+	content into hash with __evalcache_hash__(m) method. Objects without meaningful
+	representation are hashed by pickled state (see updatehash_pickle).
+
+	Warn: If you use changing between program starts object representation (f.e. object.__repr__)
+	for hashing, this library will not be work corectly. 
+
+	Arguments
+	---------
+	m -- hashlib-like algorithm instance.
+	obj -- hashable object
+	"""
+	memoized = (lobj is not None 
+		and lobj.__lazybase__.immutable_types 
+		and isinstance(obj, lobj.__lazybase__.immutable_types)
+		and not getattr(_argument_memo, "nested", False))
+
+	profiler = lobj.__lazybase__.hash_profiler if lobj is not None else None
+	if profiler is not None:
+		if memoized:
+			funcname = "argument_digest"
+		else:
+			hashfunc = hashfuncs.dispatch(obj.__class__)
+			funcname = function_name(hashfunc) if hashfunc is not None else "<repr>"
+		profiler.enter(obj.__class__.__qualname__, funcname)
+
+	try:
+		updatehash_str(m, repr(obj.__class__), lobj)
+
+		if memoized:
+			m.update(lobj.__lazybase__.argument_digest(obj, lobj))
+		else:
+			updatehash_content(m, obj, lobj)
+	finally:
+		if profiler is not None:
+			profiler.leave()
 
 
 def set_lazyvalue(obj, value):
@@ -925,62 +1714,275 @@ def set_lazyvalue(obj, value):
 	obj.__lazyheap__ = True
 
 
+def contains_many(cache, keys):
+	"""Get set of keys, which are stored in cache. 
+
+	Uses batched cache.contains_many(keys) if cache implements it.
+	"""
+	if cache is None:
+		return set()
+	if hasattr(cache, "contains_many"):
+		return set(cache.contains_many(keys))
+	return set(k for k in keys if k in cache)
+
+
+def get_many(cache, keys):
+	"""Load values of keys from cache. Return dict of found keys.
+
+	Uses batched cache.get_many(keys) if cache implements it.
+	"""
+	if hasattr(cache, "get_many"):
+		return cache.get_many(keys)
+
+	ret = {}
+	for k in keys:
+		try:
+			ret[k] = cache[k]
+		except KeyError:
+			pass
+	return ret
+
+
+def set_many(cache, items):
+	"""Store key-value pairs (dict or iterable of pairs) to cache.
+
+	Uses batched cache.set_many(items) if cache implements it.
+	"""
+	if hasattr(cache, "set_many"):
+		return cache.set_many(items)
+
+	if isinstance(items, dict):
+		items = items.items()
+	for k, v in items:
+		cache[k] = v
+
+
+def lazy_children(obj):
+	"""Lazy objects, which are used by obj as generic or arguments.
+	Objects are listed in order of expanding on evaluation."""
+	ret = []
+	if not obj.kwargs:
+		# Fast path for flat arguments, which is the common case.
+		for a in (obj.generic, *obj.args):
+			if isinstance(a, LazyObject):
+				ret.append(a)
+			elif isinstance(a, (list, tuple, dict)):
+				break
+		else:
+			return ret
+		ret = []
+
+	stack = [obj.kwargs, obj.args, obj.generic]
+	while stack:
+		a = stack.pop()
+		if isinstance(a, LazyObject):
+			ret.append(a)
+		elif isinstance(a, (list, tuple)):
+			stack.extend(reversed(a))
+		elif isinstance(a, dict):
+			for k, v in reversed(list(a.items())):
+				stack.append(v)
+				stack.append(k)
+	return ret
+
+
+def probe_caches(objs, present):
+	"""Add (id(cache), key) pairs of lazy objects, which are stored in their
+	caches, to set present. Every cache is probed with one contains_many call.
+	"""
+	caches = {}
+	keys = {}
+	for obj in objs:
+		cache = obj.__lazybase__.cache
+		if cache is None:
+			continue
+		caches[id(cache)] = cache
+		keys.setdefault(id(cache), []).append(obj.__lazyhexhash__)
+
+	for cid, cache in caches.items():
+		present.update((cid, k) for k in contains_many(cache, keys[cid]))
+
+
+def tree_cache_state(root, skip_heap=False, stop=None):
+	"""Find out which lazy objects of tree are stored in their caches.
+	Return predicate, which answers for lazy object.
+
+	skip_heap -- don't go through objects with known values.
+	stop -- predicate. Don't go through stored objects, for which it is true.
+		Tree is probed by windows of levels, which depth doubles every time,
+		so the number of batches is logarithmic in depth of the tree, and 
+		objects no deeper than one window below stored objects are probed.
+		Otherwise keys of the whole tree are probed with a single batch.
+	"""
+	present = set()
+	incache = lambda obj: (id(obj.__lazybase__.cache), obj.__lazyhexhash__) in present
+
+	if stop is None:
+		objs = []
+
+		def enter(obj):
+			if skip_heap and obj.__lazyheap__:
+				return False
+			objs.append(obj)
+			return True
+
+		walk_tree(root, enter)
+		probe_caches(objs, present)
+		return incache
+
+	visited = set()
+	frontier = [root] if isinstance(root, LazyObject) else []
+	depth = 1
+	while frontier:
+		# Objects of the next depth levels are probed with one batch.
+		window = {}
+		level = frontier
+		for _ in range(depth):
+			below = []
+			for obj in level:
+				key = obj.__lazyhexhash__
+				if key in visited:
+					continue
+				visited.add(key)
+				window[key] = obj
+				if not (skip_heap and obj.__lazyheap__):
+					below.extend(lazy_children(obj))
+			level = below
+		probe_caches(
+			[o for o in window.values() if not (skip_heap and o.__lazyheap__)], present)
+
+		# Objects below the window, which aren't under stored objects.
+		walked = set()
+		stack = list(frontier)
+		frontier = []
+		while stack:
+			obj = stack.pop()
+			key = obj.__lazyhexhash__
+			if key in walked or key not in window:
+				continue
+			walked.add(key)
+			if (skip_heap and obj.__lazyheap__) or (stop(obj) and incache(obj)):
+				continue
+			for child in lazy_children(obj):
+				if child.__lazyhexhash__ in window:
+					stack.append(child)
+				elif child.__lazyhexhash__ not in visited:
+					frontier.append(child)
+		depth *= 2
+
+	return incache
+
+
 __tree_tab = "    "
 
 
+def walk_tree(root, enter):
+	"""Visit every lazy object of tree once.
+
+	Objects with equal keys are visited once, so time and memory are linear in 
+	the number of unique objects. Objects are visited in order of expanding 
+	on evaluation. enter(obj) is called on visit, children of obj are visited 
+	if it returns true.
+	"""
+	visited = set()
+	stack = [root] if isinstance(root, LazyObject) else []
+	while stack:
+		obj = stack.pop()
+		key = obj.__lazyhexhash__
+		if key in visited:
+			continue
+		visited.add(key)
+		if enter(obj):
+			stack.extend(reversed(lazy_children(obj)))
+
+
+def make_deferred_hashes(root):
+	"""Compute deferred hashes of root and its lazy arguments in post-order.
+
+	Explicit stack is used, so depth of deferred chains isn't limited by
+	recursion limit. Objects are identified by id, because their keys aren't 
+	known yet (unlike walk_tree).
+	"""
+	entered = set()
+	stack = [(root, False)]
+	while stack:
+		obj, expanded = stack.pop()
+		if obj.__lazydigest__ is not None:
+			continue
+		if expanded:
+			obj.__lazy_make_hash__()
+			continue
+		if id(obj) in entered:
+			continue
+		entered.add(id(obj))
+
+		stack.append((obj, True))
+		stack.extend(
+			(c, False) for c in lazy_children(obj) if c.__lazydigest__ is None)
+
+
 def print_tree(obj, t=0):
-	"""Print lazy tree in user friendly format."""
-	if isinstance(obj, LazyObject):
-		# print(__tree_tab*t, end=''); print("LazyObject:")
-		if obj.generic is not None:
-			print(__tree_tab * t, end="")
-			print("type: {}\n".format(obj.__class__), end="")
-			print(__tree_tab * t, end="")
-			print("hash: {}...\n".format(obj.__lazyhexhash__[0:20]), end="")
-			print(__tree_tab * t, end="")
-			print("generic:\n", end="")
-			print_tree(obj.generic, t + 1)
-			if len(obj.args):
-				print(__tree_tab * t, end="")
-				print("args:\n", end="")
-				print_tree(obj.args, t + 1)
+	"""Print lazy tree in user friendly format.
+	Repeated objects are printed once and referenced by hash later."""
+	visited = set()
+	stack = [(obj, t)]
+	while stack:
+		obj, t = stack.pop()
+		if t is None:
+			# Deferred line of output.
+			print(obj)
+			continue
+
+		tab = __tree_tab * t
+		if isinstance(obj, LazyObject):
+			if is_trivial(obj):
+				print(tab + repr(obj.__lazyvalue__))
+				continue
+
+			key = obj.__lazyhexhash__
+			if key in visited:
+				print(tab + "same: {}...".format(key[0:20]))
+				continue
+			visited.add(key)
+
+			if obj.__lazypruned__:
+				print(tab + "pruned: {}...".format(key[0:20]))
+				continue
+
+			print(tab + "type: {}".format(obj.__class__))
+			print(tab + "hash: {}...".format(key[0:20]))
+			print(tab + "generic:")
+
+			stack.append((tab + "-------", None))
 			if len(obj.kwargs):
-				print(__tree_tab * t, end="")
-				print("kwargs:\n", end="")
-				print_tree(obj.kwargs, t + 1)
-			print(__tree_tab * t, end="")
-			print("-------")
+				stack.append((obj.kwargs, t + 1))
+				stack.append((tab + "kwargs:", None))
+			if len(obj.args):
+				stack.append((obj.args, t + 1))
+				stack.append((tab + "args:", None))
+			stack.append((obj.generic, t + 1))
+		elif isinstance(obj, list) or isinstance(obj, tuple):
+			stack.extend((o, t) for o in reversed(obj))
 		else:
-			print(__tree_tab * t, end="")
-			print(repr(obj.__lazyvalue__))
-	elif isinstance(obj, list) or isinstance(obj, tuple):
-		for o in obj:
-			print_tree(o, t)
-	else:
-		print(__tree_tab * t, end="")
-		print(repr(obj))
+			print(tab + repr(obj))
 
-def _collect_tree_information(obj, dct):
-	if not isinstance(obj, LazyObject):
-		dct["fnodes"].append(obj)
-		return
 
-	if obj.generic is None:
-		dct["fnodes"].append(obj.__lazyvalue__)		
-		dct["trivial"] += 1
-	else:
-		dct["nontrivial"] += 1
-
-	dct["hashes"].append(obj.__lazyhexhash__)
+def _direct_arguments(obj):
+	"""Generic and arguments of lazy object (without expanding of containers)"""
+	if obj.generic is not None:
+		yield obj.generic
+	yield from obj.args
+	yield from obj.kwargs.values()
 
-	if obj.__lazyhexhash__ in obj.__lazybase__.cache:
-		dct["incache"] += 1
-	
-	if obj.generic: _collect_tree_information(obj.generic, dct)
-	for a in obj.args: _collect_tree_information(a, dct)
-	for a in obj.kwargs.values(): _collect_tree_information(a, dct)
 
 def collect_tree_information(obj):
+	"""Statistic of unique objects of lazy tree.
+
+	hashes -- keys of lazy objects
+	fnodes -- values of endpoints and nonlazy arguments
+	incache -- number of objects stored in cache
+	trivial, nontrivial -- number of endpoints and other objects
+	"""
 	dct = {
 		"hashes" : [],
 		"fnodes" : [],
@@ -989,79 +1991,82 @@ def collect_tree_information(obj):
 		"nontrivial" : 0
 	}
 
-	_collect_tree_information(obj, dct)
-	return dct
-
-def is_trivial(obj):
-	return obj.generic is None
-
-def _execution_emulate_information(obj, dct):
 	if not isinstance(obj, LazyObject):
-		return
+		dct["fnodes"].append(obj)
+		return dct
 
-	if (evalcache.lazy.is_trivial(obj)):
-		return
+	incache = tree_cache_state(obj)
+
+	def enter(o):
+		if is_trivial(o):
+			dct["fnodes"].append(o.__lazyvalue__)
+			dct["trivial"] += 1
+		else:
+			dct["nontrivial"] += 1
+			dct["fnodes"].extend(
+				a for a in _direct_arguments(o) if not isinstance(a, LazyObject))
 
-	if (obj.__lazyhexhash__ in obj.__lazybase__.cache):
-		dct["need_to_load"] += 1		
-		return
+		dct["hashes"].append(o.__lazyhexhash__)
+		if incache(o):
+			dct["incache"] += 1
+		return True
 
-	dct["need_to_do"] += 1
+	walk_tree(obj, enter)
+	return dct
 
-	if obj.generic: _execution_emulate_information(obj.generic, dct)
-	for a in obj.args: _execution_emulate_information(a, dct)
-	for a in obj.kwargs.values(): _execution_emulate_information(a, dct)
+def is_trivial(obj):
+	"""True for endpoint object. Pruned objects aren't endpoints."""
+	return obj.generic is None and not obj.__lazypruned__
 
 def execution_emulate_information(obj):
+	"""Number of unique objects, which will be evaluated or loaded on unlazy"""
 	dct = {
 		"need_to_do": 0,
 		"need_to_load": 0
 	}
 
-	_execution_emulate_information(obj, dct)
-	return dct
-
-def _tree_objects(obj, arr):
-	if not isinstance(obj, LazyObject):
-		return
+	incache = tree_cache_state(obj, stop=lambda o: True)
 
-	arr.append(obj)
+	def enter(o):
+		if is_trivial(o):
+			return False
+		if incache(o):
+			dct["need_to_load"] += 1
+			return False
+		dct["need_to_do"] += 1
+		return True
 
-	if obj.generic is not None: _tree_objects(obj.generic, arr)
-	for a in obj.args: _tree_objects(a, arr)
-	for a in obj.kwargs.values(): _tree_objects(a, arr)
+	walk_tree(obj, enter)
+	return dct
 
 def tree_objects(obj):
+	"""Set of unique lazy objects of tree"""
 	arr = []
-	_tree_objects(obj, arr)
+	walk_tree(obj, lambda o: arr.append(o) or True)
 	return set(arr)
 
-def _tree_needeval(obj, arrs):
-	if not isinstance(obj, LazyObject):
-		return
-
-	if obj.__lazyvalue__ is not None:
-		return
-
-	if obj.__lazyhexhash__ in obj.__lazybase__.cache:
-		arrs.toload.append(obj)
-		return
-
-	arrs.toeval.append(obj)
-
-	if obj.generic is not None: _tree_needeval(obj.generic, arrs)
-	for a in obj.args: _tree_needeval(a, arrs)
-	for a in obj.kwargs.values(): _tree_needeval(a, arrs)
-
 def tree_needeval(obj):
+	"""Unique lazy objects of tree, which will be evaluated (toeval) 
+	or loaded (toload) on unlazy."""
 	class _result:
 		pass
 
 	arrs = _result()
 	arrs.toeval = []
 	arrs.toload = []
-	 
-	_tree_needeval(obj, arrs)
+
+	incache = tree_cache_state(obj, skip_heap=True, stop=lambda o: True)
+
+	def enter(o):
+		if o.__lazyvalue__ is not None:
+			return False
+		if incache(o):
+			arrs.toload.append(o)
+			return False
+		arrs.toeval.append(o)
+		return True
+
+	walk_tree(obj, enter)
 
 	arrs.toeval = set(arrs.toeval)
 	arrs.toload = set(arrs.toload)
@@ -1102,3 +2107,10 @@ def lazy_getattr(obj, attr, wrapped_obj):
 		return functools.partial(ret.func, wrapped_obj.obj)
 
 	return ret
+
+
+import evalcache.engine
+import evalcache.parallel
+import evalcache.prefetch
+import evalcache.costs
+import evalcache.admission
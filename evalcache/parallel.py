@@ -0,0 +1,431 @@
+"""Parallel evaluation of independent subtrees.
+
+The tree is planned once: every lazy object without a local value is either
+loaded from cache or evaluated after all its lazy arguments. Ready nodes are
+submitted to a concurrent.futures executor. Nodes with equal hashes are
+evaluated once. Results are stored to cache by workers as they complete.
+
+Thread pools execute nodes in the process memory (see ThreadBackend).
+Process pools execute nodes in worker processes, which share the directory
+cache with the parent (see ProcessBackend).
+
+Status callbacks and diagnostic output are invoked from the calling thread.
+Lazy objects, which are unlazied inside evaluated functions, are evaluated
+sequentially in the worker.
+"""
+
+import types
+import pickle
+import importlib
+import threading
+import concurrent.futures
+
+import evalcache.lazy
+import evalcache.engine
+from evalcache.lazy import lazy_children
+from evalcache.engine import Plan
+
+_local = threading.local()
+
+
+def in_worker():
+    """True if current thread executes a node of parallel evaluation"""
+    return getattr(_local, "active", False)
+
+
+def _cache_access(cache):
+    """Lock for cache operations or None if cache is thread safe"""
+    if type(cache) is dict or getattr(cache, "thread_safe", False):
+        return None
+    lock = getattr(cache, "_evalcache_lock", None)
+    if lock is None:
+        lock = threading.Lock()
+        try:
+            cache._evalcache_lock = lock
+        except AttributeError:
+            pass
+    return lock
+
+
+def lazydo(obj):
+    """Evaluate node, which arguments are already known or stored in cache"""
+    steps = evalcache.engine.lazydo_steps(obj)
+    value = None
+    while True:
+        try:
+            child = steps.send(value)
+        except StopIteration as ret:
+            return ret.value
+
+        if child.__lazyheap__:
+            value = child.__lazyvalue__
+        else:
+            value = evalcache.lazy.unlazy(child)
+
+
+def do_node(obj, load):
+    """Load or evaluate node in current process. Return value and diagnostic message."""
+    cache = obj.__lazybase__.cache
+    key = obj.__lazyhexhash__
+    lock = _cache_access(cache)
+
+    if load:
+        try:
+            if lock is None:
+                return cache[key], "load"
+            with lock:
+                return cache[key], "load"
+        except Exception:
+            msg = evalcache.lazy.broken_entry(cache, key, lock)
+    else:
+        msg = "save" if obj.__encache__ else "eval"
+
+    value = lazydo(obj)
+
+    if msg == "save" and not evalcache.lazy.admitted(obj, value):
+        msg = "skip"
+
+    if msg not in ("eval", "skip"):
+        if lock is None:
+            cache[key] = value
+        else:
+            with lock:
+                cache[key] = value
+
+    return value, msg
+
+
+def _thread_node(obj, load):
+    _local.active = True
+    try:
+        return do_node(obj, load)
+    finally:
+        _local.active = False
+
+
+class ThreadBackend:
+    """Nodes are loaded and evaluated by executor's threads"""
+
+    def __init__(self, plan):
+        self.plan = plan
+
+    def submit(self, executor, key):
+        obj = self.plan.nodes[key][0]
+        return executor.submit(_thread_node, obj, key in self.plan.toload)
+
+    def complete(self, key, future):
+        """Return (has value, value, msg)"""
+        value, msg = future.result()
+        return True, value, msg
+
+    def close(self):
+        pass
+
+
+class Unshippable(Exception):
+    """Argument can't be passed to worker process"""
+
+
+class BrokenEntry(Exception):
+    """Cache entry of argument can't be loaded by worker"""
+
+    def __init__(self, key):
+        Exception.__init__(self, key)
+        self.key = key
+
+
+class CacheRef:
+    """Argument of process task, which worker loads from the shared cache"""
+
+    def __init__(self, key):
+        self.key = key
+
+
+class FunctionRef:
+    """Function passed to process task by module and qualified name.
+
+    Lazy decorators replace module attributes by lazy objects, so ordinary
+    pickling by reference fails for decorated functions.
+    """
+
+    def __init__(self, module, qualname):
+        self.module = module
+        self.qualname = qualname
+
+    def resolve(self):
+        obj = importlib.import_module(self.module)
+        for name in self.qualname.split("."):
+            obj = getattr(obj, name)
+        if isinstance(obj, evalcache.lazy.LazyObject):
+            obj = obj.__lazyvalue__
+        return obj
+
+    @staticmethod
+    def make(func):
+        """Make reference or return None if func can't be found by name"""
+        module = getattr(func, "__module__", None)
+        qualname = getattr(func, "__qualname__", "")
+        if module is None or "<" in qualname:
+            return None
+        ref = FunctionRef(module, qualname)
+        try:
+            if ref.resolve() is func:
+                return ref
+        except Exception:
+            pass
+        return None
+
+
+_worker_caches = {}
+
+
+def _worker_cache(spec):
+    cache = _worker_caches.get(spec)
+    if cache is None:
+        cache = _worker_caches[spec] = spec[0](spec[1])
+    return cache
+
+
+def _worker_load(cache, key):
+    try:
+        try:
+            return cache[key]
+        except KeyError:
+            # Key can be stored after the cache state was read.
+            cache.refresh(key)
+            return cache[key]
+    except KeyError:
+        raise
+    except Exception:
+        raise BrokenEntry(key)
+
+
+def _worker_resolve(cache, arg):
+    if isinstance(arg, CacheRef):
+        return _worker_load(cache, arg.key)
+    elif isinstance(arg, FunctionRef):
+        return arg.resolve()
+    elif isinstance(arg, list):
+        return [_worker_resolve(cache, a) for a in arg]
+    elif isinstance(arg, dict):
+        return {_worker_resolve(cache, k): _worker_resolve(cache, v) for k, v in arg.items()}
+    return arg
+
+
+def _process_node(spec, key, generic, args, kwargs, encache):
+    """Process task. Value is stored to the shared cache and only a status returns."""
+    cache = _worker_cache(spec)
+    try:
+        func = _worker_resolve(cache, generic)
+        args = _worker_resolve(cache, args)
+        kwargs = _worker_resolve(cache, kwargs)
+    except BrokenEntry as ex:
+        return "reeval", ex.key
+    except Exception as ex:
+        return "error", ex
+
+    try:
+        value = evalcache.lazy.expand(func(*args, **kwargs))
+    except Exception as ex:
+        return "error", ex
+
+    if encache:
+        cache[key] = value
+        return "stored", None
+    return "value", value
+
+
+class ProcessBackend:
+    """Nodes are evaluated by executor's processes.
+
+    Generic is passed by reference, arguments are pickled. Arguments evaluated
+    early are passed as cache keys and loaded by the worker. Results are stored
+    to the shared directory cache by the worker, so only the key returns.
+    Nodes, which can't be passed to a worker (f.e. lambdas, closures, prevent_unwrap
+    lists), are evaluated in the parent process by a local thread, so the
+    scheduler isn't blocked. The local thread also reevaluates nodes, which
+    arguments were found broken by a worker.
+    """
+
+    def __init__(self, plan, cache):
+        if not hasattr(cache, "dirpath") or not hasattr(cache, "refresh"):
+            raise TypeError("process pool evaluation requires directory cache (DirCache or DirCache_v2)")
+
+        self.plan = plan
+        self.cache = cache
+        self.spec = (type(cache), cache.dirpath)
+        self.local = None
+
+    def ship(self, arg):
+        LazyObject = evalcache.lazy.LazyObject
+
+        if isinstance(arg, LazyObject):
+            if arg.__lazyheap__:
+                return arg.__lazyvalue__
+            return CacheRef(arg.__lazyhexhash__)
+        elif isinstance(arg, evalcache.lazy.NoExpand):
+            raise Unshippable()
+        elif isinstance(arg, (list, tuple)):
+            return [self.ship(a) for a in arg]
+        elif isinstance(arg, dict):
+            return {self.ship(k): self.ship(v) for k, v in arg.items()}
+        return arg
+
+    def ship_generic(self, obj):
+        generic = self.ship(obj.generic)
+        if isinstance(generic, types.FunctionType):
+            generic = FunctionRef.make(generic)
+            if generic is None:
+                return None
+
+        try:
+            pickle.dumps(generic)
+        except Exception:
+            return None
+        return generic
+
+    def submit(self, executor, key):
+        obj = self.plan.nodes[key][0]
+        if key in self.plan.toload:
+            future = concurrent.futures.Future()
+            future.set_result(("toload", None))
+            return future
+
+        try:
+            if obj.__lazy_unwrap_prevent_list__ is not None:
+                raise Unshippable()
+            generic = self.ship_generic(obj)
+            if generic is None:
+                raise Unshippable()
+            args = self.ship(obj.args)
+            kwargs = self.ship(obj.kwargs)
+        except Unshippable:
+            return self.in_process(obj)
+
+        return executor.submit(
+            _process_node, self.spec, key, generic, args, kwargs, obj.__encache__
+        )
+
+    def in_process(self, obj):
+        if self.local is None:
+            self.local = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        return self.local.submit(_in_process_node, obj)
+
+    def complete(self, key, future):
+        """Return (has value, value, msg) or future of the resubmitted node"""
+        obj = self.plan.nodes[key][0]
+        try:
+            status, payload = future.result()
+        except concurrent.futures.BrokenExecutor:
+            raise
+        except Exception:
+            # Task or its result can't be pickled.
+            return self.in_process(obj)
+
+        if status == "reeval":
+            # Argument is loaded and reevaluated by the parent.
+            evalcache.lazy.broken_entry(self.cache, payload)
+            return self.in_process(obj)
+        elif status == "error":
+            raise payload
+        elif status == "toload":
+            return False, None, None
+        elif status == "stored":
+            self.cache.refresh(key)
+            return False, None, "save"
+        elif status == "value":
+            return True, payload, "eval"
+        else:
+            value, msg = payload
+            return True, value, msg
+
+    def close(self):
+        if self.local is not None:
+            self.local.shutdown()
+
+
+def _in_process_node(obj):
+    return "inprocess", _thread_node(obj, False)
+
+
+def evaluate(root, executor):
+    """Get a result of evaluation of lazy object using executor for independent nodes"""
+    lazifier = root.__lazybase__
+    evalcache.lazy.check_release_values(lazifier, "parallel")
+    if root.__lazyheap__:
+        return evalcache.lazy.unlazy(root)
+
+    plan = Plan(root)
+    rootkey = root.__lazyhexhash__
+
+    if isinstance(executor, concurrent.futures.ProcessPoolExecutor):
+        backend = ProcessBackend(plan, lazifier.cache)
+    else:
+        backend = ThreadBackend(plan)
+
+    dependents = {key: [] for key in plan.nodes}
+    waiting = {}
+    for key, deps in plan.deps.items():
+        waiting[key] = len(deps)
+        for dep in deps:
+            dependents[dep].append(key)
+
+    if lazifier.status_notify:
+        evalcache.lazy.notify_start_node(root, plan)
+
+    futures = {}
+
+    def submit(key):
+        if lazifier.status_notify and key != rootkey:
+            for o in plan.nodes[key]:
+                evalcache.lazy.notify_start_node(o)
+        futures[backend.submit(executor, key)] = key
+
+    for key, count in waiting.items():
+        if count == 0:
+            submit(key)
+
+    try:
+        while futures:
+            done, _ = concurrent.futures.wait(
+                futures, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                key = futures.pop(future)
+                result = backend.complete(key, future)
+                if isinstance(result, concurrent.futures.Future):
+                    futures[result] = key
+                    continue
+                known, value, msg = result
+
+                for o in plan.nodes[key]:
+                    if known:
+                        evalcache.lazy.set_lazyvalue(o, value)
+                        evalcache.lazy.value_known(o, msg)
+                    if lazifier.diag and msg is not None:
+                        evalcache.lazy.print_diag(o, msg)
+                    if lazifier.status_notify and o is not root:
+                        evalcache.lazy.notify_fini_node(o)
+
+                for dependent in dependents[key]:
+                    waiting[dependent] -= 1
+                    if waiting[dependent] == 0:
+                        submit(dependent)
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        if lazifier.status_notify:
+            lazifier.tree_evaluation_in_progress = False
+        raise
+    finally:
+        backend.close()
+
+    if not root.__lazyheap__:
+        # Value was stored to cache by a worker process or dropped by memory budget.
+        evalcache.lazy.set_lazyvalue(root, lazifier.cache[rootkey])
+    value = root.__lazyvalue__
+
+    if lazifier.status_notify:
+        evalcache.lazy.notify_fini_node(root)
+
+    return value
@@ -0,0 +1,184 @@
+"""Execution plan of lazy tree with estimations of its cost.
+
+evalcache.plan(obj) finds out, which nodes of the tree will be loaded from
+cache and which will be evaluated (see engine.Plan), orders them as the
+evaluator does and estimates their durations and value sizes with costs,
+which were recorded on earlier runs (Lazy option record_costs, costs.py).
+Nothing is loaded or evaluated.
+
+    p = evalcache.plan(root)
+    print(p.seconds, p.critical_seconds, p.bytes)
+    p.dump(limit=10)
+"""
+
+import sys
+
+import evalcache.lazy
+import evalcache.engine
+import evalcache.costs
+
+
+class Step:
+    """Planned node.
+
+    action -- "load" or "eval"
+    name -- generic name (see costs.generic_name) or None
+    seconds, nbytes -- estimated duration and value size
+    known -- estimation is based on recorded costs (otherwise seconds is 0)
+    deps -- keys of steps, which must be done before
+    finish -- estimated time from start of evaluation to the end of the step,
+        if independent steps are performed in parallel
+    """
+
+    def __init__(self, obj, action, estimate, deps):
+        self.obj = obj
+        self.key = obj.__lazyhexhash__
+        self.action = action
+        self.name = evalcache.costs.generic_name(obj)
+        self.known = estimate is not None
+        self.seconds, self.nbytes = estimate if estimate is not None else (0.0, 0)
+        self.deps = deps
+        self.finish = 0.0
+
+    def __repr__(self):
+        return "Step({}, {}, {:.6f}s, {}B)".format(
+            self.action, self.name, self.seconds, int(self.nbytes)
+        )
+
+
+class ExecutionPlan:
+    """Ordered steps of tree evaluation.
+
+    steps -- steps in order of execution (arguments before their users)
+    toload, toeval -- steps, which load values from cache or evaluate them
+    unknown -- steps without recorded costs
+    critical_path -- the longest by estimated time chain of dependent steps,
+        from the first step to the root
+    seconds -- estimated time of sequential evaluation
+    critical_seconds -- estimated time of the critical path
+        (lower bound of parallel evaluation)
+    load_bytes -- estimated size of loaded values
+    save_bytes -- estimated size of evaluated values, which are stored to cache
+    """
+
+    def __init__(self, steps):
+        self.steps = steps
+        self.toload = [s for s in steps if s.action == "load"]
+        self.toeval = [s for s in steps if s.action == "eval"]
+        self.unknown = [s for s in steps if not s.known]
+        self.seconds = sum(s.seconds for s in steps)
+        self.load_bytes = sum(s.nbytes for s in self.toload)
+        self.save_bytes = sum(
+            s.nbytes for s in self.toeval
+            if s.obj.__encache__ and s.obj.__lazybase__.cache is not None
+        )
+
+        bykey = {}
+        before = {}
+        for step in steps:
+            bykey[step.key] = step
+            prev = max(
+                (bykey[d] for d in step.deps), key=lambda s: s.finish, default=None
+            )
+            step.finish = step.seconds + (prev.finish if prev is not None else 0.0)
+            before[step.key] = prev
+
+        self.critical_path = []
+        step = steps[-1] if steps else None
+        while step is not None:
+            self.critical_path.append(step)
+            step = before[step.key]
+        self.critical_path.reverse()
+        self.critical_seconds = steps[-1].finish if steps else 0.0
+
+    @property
+    def bytes(self):
+        return self.load_bytes + self.save_bytes
+
+    @property
+    def dominant(self):
+        """Step with the longest estimated duration or None"""
+        return max(self.steps, key=lambda s: s.seconds, default=None)
+
+    def table(self, limit=None):
+        """Format the longest steps as text table"""
+        steps = sorted(self.steps, key=lambda s: s.seconds, reverse=True)
+        if limit is not None:
+            steps = steps[:limit]
+
+        critical = set(s.key for s in self.critical_path)
+        lines = ["{:>6} {:>12} {:>12} {:>4}  {:<20}  {}".format(
+            "action", "seconds", "bytes", "crit", "key", "generic")]
+        for s in steps:
+            lines.append("{:>6} {:>12} {:>12} {:>4}  {:<20}  {}".format(
+                s.action,
+                "{:.6f}".format(s.seconds) if s.known else "?",
+                int(s.nbytes) if s.known else "?",
+                "*" if s.key in critical else "",
+                s.key[:20],
+                s.name,
+            ))
+        return "\n".join(lines)
+
+    def dump(self, limit=None, file=None):
+        file = file if file is not None else sys.stdout
+        print(self.table(limit), file=file)
+        print(file=file)
+        print("steps: {} (load: {}, eval: {}, unknown: {})".format(
+            len(self.steps), len(self.toload), len(self.toeval), len(self.unknown)),
+            file=file)
+        print("estimated time: {:.6f}s (critical path: {:.6f}s, {} steps)".format(
+            self.seconds, self.critical_seconds, len(self.critical_path)), file=file)
+        print("estimated bytes: {} (load: {}, save: {})".format(
+            int(self.bytes), int(self.load_bytes), int(self.save_bytes)), file=file)
+
+    def __repr__(self):
+        return "ExecutionPlan(steps={}, load={}, eval={}, seconds={:.6f}, critical={:.6f})".format(
+            len(self.steps), len(self.toload), len(self.toeval),
+            self.seconds, self.critical_seconds
+        )
+
+
+def _costs(lazifier, known):
+    costs = known.get(id(lazifier))
+    if costs is None:
+        costs = lazifier.costs
+        if costs is None:
+            costs = evalcache.costs.Costs.load(evalcache.costs.costs_path(lazifier))
+        known[id(lazifier)] = costs
+    return costs
+
+
+def plan(obj):
+    """Execution plan of lazy object obj (see ExecutionPlan)"""
+    if not isinstance(obj, evalcache.lazy.LazyObject):
+        return ExecutionPlan([])
+
+    nodes = evalcache.engine.Plan(obj)
+    known = {}
+    steps = []
+    seen = set()
+
+    stack = [(obj, False)]
+    while stack:
+        o, expanded = stack.pop()
+        key = o.__lazyhexhash__
+        if expanded:
+            costs = _costs(o.__lazybase__, known)
+            if key in nodes.toload:
+                steps.append(Step(o, "load", costs.load_estimate(o), ()))
+            else:
+                steps.append(Step(o, "eval", costs.eval_estimate(o), nodes.deps[key]))
+            continue
+
+        if key in seen or key not in nodes.nodes:
+            continue
+        seen.add(key)
+
+        stack.append((o, True))
+        if key not in nodes.toload:
+            stack.extend(
+                (c, False) for c in reversed(evalcache.lazy.lazy_children(o))
+            )
+
+    return ExecutionPlan(steps)
@@ -0,0 +1,103 @@
+"""Read-ahead of cached values of lazy trees.
+
+Before evaluation starts, the tree is planned (see engine.Plan) and values of
+stored nodes are loaded from cache by an I/O thread pool in order of
+evaluation. The evaluator takes loaded values instead of reading the cache,
+so disk latency overlaps with computations.
+
+Memory is bounded by the number of values, which are loaded (or being loaded)
+but not yet taken by the evaluator (Lazy option prefetch_limit).
+
+Read-ahead is used only for caches, which can be accessed from different
+threads without locking (dict or caches with thread_safe attribute).
+
+Recursive unlazy uses the same cache state of planned tree (engine.Prefetch)
+as the iterative evaluator, see unlazy.
+"""
+
+import threading
+import collections
+
+import evalcache.lazy
+import evalcache.engine
+
+_local = threading.local()
+
+
+def active():
+    """engine.Prefetch of current thread recursive evaluation or None"""
+    return getattr(_local, "prefetch", None)
+
+
+def available(lazifier):
+    """True if values of lazifier's tree can be loaded ahead"""
+    cache = lazifier.cache
+    return bool(lazifier.prefetch) and cache is not None and (
+        type(cache) is dict or getattr(cache, "thread_safe", False)
+    )
+
+
+class ReadAhead:
+    """Values of planned nodes, which are loaded by executor.
+
+    It is used as dict of values: `key in readahead` is true for keys, which
+    are planned and not taken yet, readahead.pop(key) waits for the value and
+    returns it (or raises exception of loading).
+    """
+
+    def __init__(self, cache, keys, executor, limit):
+        self.cache = cache
+        self.executor = executor
+        self.limit = max(1, limit)
+        self.pending = collections.OrderedDict.fromkeys(keys)
+        self.futures = {}
+        self.feed()
+
+    def feed(self):
+        while self.pending and len(self.futures) < self.limit:
+            key, _ = self.pending.popitem(last=False)
+            self.futures[key] = self.executor.submit(self.cache.__getitem__, key)
+
+    def __contains__(self, key):
+        return key in self.futures or key in self.pending
+
+    def pop(self, key):
+        future = self.futures.pop(key, None)
+        try:
+            if future is None:
+                # Evaluation reached the key before it was submitted.
+                del self.pending[key]
+                return self.cache[key]
+            return future.result()
+        finally:
+            self.feed()
+
+    def close(self):
+        for future in self.futures.values():
+            future.cancel()
+        self.futures.clear()
+        self.pending.clear()
+
+
+def read_ahead(lazifier, plan):
+    """Start loading of stored values of planned tree (see engine.Plan)"""
+    keys = [
+        key
+        for key in plan.loadorder
+        if plan.nodes[key][0].__lazybase__.cache is lazifier.cache
+    ]
+    return ReadAhead(
+        lazifier.cache, keys, lazifier.prefetch_executor(), lazifier.prefetch_limit
+    )
+
+
+def unlazy(root, debug=False):
+    """Recursive unlazy of root with batched probing and loading (or read-ahead)
+    of its stored values (see engine.Prefetch)"""
+    prefetch = evalcache.engine.Prefetch(root)
+    _local.prefetch = prefetch
+    try:
+        return evalcache.lazy.unlazy(root, debug)
+    finally:
+        _local.prefetch = None
+        prefetch.close()
@@ -0,0 +1,89 @@
+"""Progress of tree evaluation for status callbacks.
+
+The tree is planned once when its evaluation starts. Counters are updated
+when nodes are done, so callbacks get progress without tree traversals.
+"""
+
+import time
+
+import evalcache.lazy
+
+
+class Progress:
+    """Counters of the current tree evaluation.
+
+    toload, toeval -- numbers of unique nodes, which are planned to be loaded
+        from cache or evaluated
+    loaded, evaluated -- numbers of planned nodes, which are done
+    """
+
+    def __init__(self):
+        self.root = None
+        self._toload = set()
+        self._toeval = set()
+        self.loaded = 0
+        self.evaluated = 0
+        self.started = None
+
+    def start(self, root, plan=None):
+        """Plan evaluation of root tree.
+
+        plan -- engine.Plan of the tree. If it isn't given, the tree is planned
+            with tree_needeval.
+        """
+        self.root = root
+        if plan is not None:
+            self._toload = set(plan.toload)
+            self._toeval = set(plan.nodes).difference(plan.toload)
+        else:
+            needeval = evalcache.lazy.tree_needeval(root)
+            self._toload = set(o.__lazyhexhash__ for o in needeval.toload)
+            self._toeval = set(o.__lazyhexhash__ for o in needeval.toeval)
+        self.toload = len(self._toload)
+        self.toeval = len(self._toeval)
+        self.loaded = 0
+        self.evaluated = 0
+        self.started = time.perf_counter()
+
+    def node_done(self, obj):
+        if self.root is None:
+            return
+
+        key = obj.__lazyhexhash__
+        if key in self._toeval:
+            self._toeval.discard(key)
+            self.evaluated += 1
+        elif key in self._toload:
+            self._toload.discard(key)
+            self.loaded += 1
+
+    @property
+    def total(self):
+        return self.toload + self.toeval
+
+    @property
+    def done(self):
+        return self.loaded + self.evaluated
+
+    @property
+    def remaining(self):
+        return self.total - self.done
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return time.perf_counter() - self.started
+
+    @property
+    def eta(self):
+        """Estimated time to the end of evaluation or None if nothing is done yet"""
+        if self.done == 0:
+            return None
+        return self.elapsed / self.done * self.remaining
+
+    def __repr__(self):
+        return "Progress(done={}/{}, loaded={}, evaluated={}, elapsed={:.3f})".format(
+            self.done, self.total, self.loaded, self.evaluated, self.elapsed
+        )
+
@@ -0,0 +1,105 @@
+"""Memory budget for evaluated values.
+
+Values of lazy objects are kept in memory after evaluation. With Lazy option
+value_memory_budget, values, which can be reloaded from cache, are tracked
+with their approximate sizes. When the total size exceeds the budget, least
+recently used values are dropped from their lazy objects, and the next unlazy
+loads them from cache again.
+
+Values of endpoints and of objects, which aren't stored or can't be loaded
+(encache or decache is disabled), are never dropped. Dropping saves memory
+only if the cache doesn't hold values in memory itself (f.e. DirCache).
+"""
+
+import sys
+import weakref
+import threading
+import collections
+
+
+def approx_size(value):
+    """Approximate memory size of value in bytes.
+
+    Buffers (f.e. numpy arrays) are measured by nbytes,
+    containers by their items (one level deep).
+    """
+    nbytes = getattr(value, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes
+
+    size = sys.getsizeof(value, 0)
+    if isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(sys.getsizeof(v, 0) for v in value)
+    elif isinstance(value, dict):
+        size += sum(sys.getsizeof(k, 0) + sys.getsizeof(v, 0) for k, v in value.items())
+    return size
+
+
+class ValueRetention:
+    """LRU of evaluated values, which can be reloaded from cache.
+
+    budget -- maximal total size of tracked values in bytes
+    size -- current total size of tracked values
+    dropped -- number of dropped values
+    """
+
+    # Diagnostic messages of nodes, which values are stored in cache.
+    PERSISTED = ("load", "save", "fail")
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.size = 0
+        self.dropped = 0
+        self.values = collections.OrderedDict()
+        self.lock = threading.RLock()
+
+    def update(self, obj, msg):
+        """Account value of obj, which was just evaluated or used with diagnostic msg"""
+        if (obj.generic is None and not obj.__lazypruned__) or not obj.__lazyheap__:
+            return
+
+        with self.lock:
+            key = id(obj)
+            if key in self.values:
+                self.values.move_to_end(key)
+                return
+
+            if msg not in self.PERSISTED or not obj.__decache__:
+                return
+
+            size = approx_size(obj.__lazyvalue__)
+            ref = weakref.ref(obj, lambda ref, key=key: self._forget(key, ref))
+            self.values[key] = (ref, size)
+            self.size += size
+            self.shrink(keep=obj)
+
+    def _forget(self, key, ref):
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is not None and entry[0] is ref:
+                del self.values[key]
+                self.size -= entry[1]
+
+    def shrink(self, keep=None):
+        """Drop least recently used values until the total size fits the budget.
+        Value of keep isn't dropped."""
+        with self.lock:
+            while self.size > self.budget and self.values:
+                key, (ref, size) = self.values.popitem(last=False)
+                obj = ref()
+                if obj is keep:
+                    self.values[key] = (ref, size)
+                    if len(self.values) == 1:
+                        break
+                    continue
+
+                self.size -= size
+                if obj is not None and obj.__lazyheap__:
+                    obj.__lazyvalue__ = None
+                    obj.__lazyheap__ = False
+                    self.dropped += 1
+
+    def clear(self):
+        with self.lock:
+            self.values.clear()
+            self.size = 0
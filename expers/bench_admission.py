@@ -0,0 +1,61 @@
+#!/usr/bin/python3
+"""Cache writes of arithmetic-heavy tree with and without admission policy.
+
+Every step combines an expensive function with several arithmetic nodes.
+
+Usage: bench_admission.py [steps]
+"""
+
+import sys
+
+sys.path.insert(0, "..")
+
+import os
+import time
+import shutil
+import tempfile
+import evalcache
+
+STEPS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+
+def heavy(a):
+    return sum(i * i for i in range(20000)) % 7 + a
+
+
+def build(lazy):
+    lheavy = lazy(heavy)
+    node = lazy(0)
+    for i in range(STEPS):
+        node = (lheavy(node * 2 + 1) - i // 3 + round(node / 5)) % 1000
+    return node
+
+
+def files(path):
+    return sum(len(f) for _, _, f in os.walk(path))
+
+
+def bench(admission):
+    path = tempfile.mkdtemp()
+    try:
+        lazy = evalcache.Lazy(
+            cache=evalcache.DirCache_v2(path), admission=admission, iterative=True
+        )
+        start = time.perf_counter()
+        value = evalcache.unlazy(build(lazy))
+        cold = time.perf_counter() - start
+
+        lazy = evalcache.Lazy(
+            cache=evalcache.DirCache_v2(path), admission=admission, iterative=True
+        )
+        start = time.perf_counter()
+        assert evalcache.unlazy(build(lazy)) == value
+        warm = time.perf_counter() - start
+        return files(path), cold, warm
+    finally:
+        shutil.rmtree(path)
+
+
+print("{:<12} {:>10} {:>10} {:>10}".format("admission", "files", "cold, s", "warm, s"))
+for admission in (None, True):
+    print("{:<12} {:>10} {:>10.3f} {:>10.3f}".format(str(admission), *bench(admission)))
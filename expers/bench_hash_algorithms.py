@@ -0,0 +1,38 @@
+#!/usr/bin/python3
+"""Per-node construction cost for builtin key algorithms.
+
+Usage: bench_hash_algorithms.py [nodes]
+"""
+
+import sys
+
+sys.path.insert(0, "..")
+
+import time
+import evalcache
+import evalcache.lazy
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+
+def bench(algo):
+    lazy = evalcache.Lazy(cache={}, algo=algo)
+
+    @lazy
+    def foo(a, b):
+        return a + b
+
+    start = time.perf_counter()
+    node = lazy(0)
+    for i in range(N):
+        node = foo(node, (i, "param", 0.5))
+    elapsed = time.perf_counter() - start
+
+    return elapsed / N, node.__lazyhexhash__
+
+
+print("{:<12} {:>10}  {}".format("algo", "us/node", "key sample"))
+for name in evalcache.lazy.hash_algorithms:
+    bench(name)  # warm up
+    per_node, key = bench(name)
+    print("{:<12} {:>10.2f}  {}".format(name, per_node * 1e6, key[:24]))
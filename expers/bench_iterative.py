@@ -0,0 +1,54 @@
+#!/usr/bin/python3
+"""Recursive unlazy against explicit stack evaluator.
+
+Usage: bench_iterative.py [tree depth] [chain length]
+"""
+
+import sys
+
+sys.path.insert(0, "..")
+
+import time
+import evalcache
+
+DEPTH = int(sys.argv[1]) if len(sys.argv) > 1 else 12
+CHAIN = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+
+
+def binary_tree(lazy, depth, i=0):
+    if depth == 0:
+        return lazy(i), 1
+    left, lcount = binary_tree(lazy, depth - 1, 2 * i)
+    right, rcount = binary_tree(lazy, depth - 1, 2 * i + 1)
+    return left + right, lcount + rcount + 1
+
+
+def chain(lazy, length):
+    node = lazy(0)
+    for i in range(length):
+        node = node + 1
+    return node, length + 1
+
+
+def bench(builder, size, iterative):
+    lazy = evalcache.Lazy(cache={}, iterative=iterative)
+    root, nodes = builder(lazy, size)
+
+    start = time.perf_counter()
+    try:
+        evalcache.unlazy(root)
+    except RecursionError:
+        return nodes, None
+    return nodes, (time.perf_counter() - start) / nodes
+
+
+print("{:<24} {:>8} {:>14}".format("case", "nodes", "us/node"))
+for name, builder, size in (
+    ("binary tree", binary_tree, DEPTH),
+    ("chain", chain, CHAIN),
+):
+    for iterative in (False, True):
+        nodes, per_node = bench(builder, size, iterative)
+        case = "{} ({})".format(name, "iterative" if iterative else "recursive")
+        result = "RecursionError" if per_node is None else "{:.2f}".format(per_node * 1e6)
+        print("{:<24} {:>8} {:>14}".format(case, nodes, result))
@@ -0,0 +1,54 @@
+#!/usr/bin/python3
+"""Memory per lazy object.
+
+Slotted LazyObject against a subclass with the instance dictionary,
+which stores the same attributes (layout of previous versions).
+
+Usage: bench_node_memory.py [nodes]
+"""
+
+import sys
+
+sys.path.insert(0, "..")
+
+import gc
+import tracemalloc
+import evalcache
+import evalcache.lazy
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+
+class DictLazyObject(evalcache.lazy.LazyObject):
+    """Stores options and both hash representations in __dict__"""
+
+    def __init__(self, *args, **kwargs):
+        evalcache.lazy.LazyObject.__init__(self, *args, **kwargs)
+        d = self.__dict__
+        d["encache"] = self.__encache__
+        d["decache"] = self.__decache__
+        d["onuse"] = self.__unlazyonuse__
+        d["heap"] = self.__lazyheap__
+        d["hash"] = self.__lazyhash__
+        d["hexhash"] = self.__lazyhexhash__
+        for name in evalcache.lazy.LazyObject.__slots__[:-1]:
+            d[name] = getattr(self, name)
+
+
+def bench(cls):
+    lazy = evalcache.Lazy(cache=None, encache=False, decache=False, registry_size=None)
+    a = lazy(1)
+
+    gc.collect()
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    nodes = [evalcache.lazy.lazyinvoke(a, a, (i,), cls=cls) for i in range(N)]
+    used = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    return used / len(nodes), sys.getsizeof(nodes[0])
+
+
+print("{:<20} {:>14} {:>14}".format("class", "bytes/node", "object size"))
+for cls in (evalcache.lazy.LazyObject, DictLazyObject):
+    per_node, size = bench(cls)
+    print("{:<20} {:>14.0f} {:>14}".format(cls.__name__, per_node, size))
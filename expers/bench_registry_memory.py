@@ -0,0 +1,55 @@
+#!/usr/bin/python3
+"""Resident memory while lazy objects are created and discarded.
+
+Weak registry (default) against registry with strong references to all objects.
+
+Usage: bench_registry_memory.py [nodes]
+"""
+
+import sys
+
+sys.path.insert(0, "..")
+
+import gc
+import os
+import resource
+import evalcache
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+CHECKPOINTS = 5
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        # Peak value on systems without procfs.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def bench(registry_size):
+    lazy = evalcache.Lazy(cache=None, encache=False, decache=False, registry_size=registry_size)
+
+    @lazy
+    def foo(a, b):
+        return a + b
+
+    gc.collect()
+    ret = [rss_mb()]
+    for i in range(N):
+        node = foo(i, 1) * 2
+        if (i + 1) % (N // CHECKPOINTS) == 0:
+            gc.collect()
+            ret.append(rss_mb())
+    return len(lazy.objects), ret
+
+
+print("{} nodes are created and discarded".format(2 * N))
+print("{:<16} {:>10}  {}".format("registry", "objects", "RSS at checkpoints, MB"))
+for name, size in (("weak", 0), ("weak+lru 1000", 1000), ("strong", None)):
+    objects, rss = bench(size)
+    print(
+        "{:<16} {:>10}  {}".format(name, objects, " ".join("{:.1f}".format(r) for r in rss))
+    )
@@ -0,0 +1,64 @@
+#!/usr/bin/python3
+"""Tree utilities on a fibonacci graph with shared subexpressions.
+
+Every node is used by two parents, so the number of paths from the root
+grows exponentially while the number of unique nodes is linear.
+Visits of a traversal without visited set are given for comparison.
+
+Usage: bench_tree_utils.py [levels]
+"""
+
+import sys
+
+sys.path.insert(0, "..")
+
+import io
+import time
+import contextlib
+import evalcache
+import evalcache.lazy
+
+LEVELS = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+
+
+def fib_graph(lazy, n):
+    nodes = [lazy(0), lazy(1)]
+    for i in range(2, n + 1):
+        nodes.append(nodes[i - 1] + nodes[i - 2])
+    return nodes[n]
+
+
+def tree_visits(n):
+    """Visits of recursive traversal without visited set"""
+    a, b = 1, 1
+    for i in range(2, n + 1):
+        a, b = b, a + b + 1
+    return b
+
+
+def bench(func, root):
+    start = time.perf_counter()
+    func(root)
+    return time.perf_counter() - start
+
+
+def print_tree(root):
+    with contextlib.redirect_stdout(io.StringIO()):
+        evalcache.print_tree(root)
+
+
+lazy = evalcache.Lazy(cache={})
+root = fib_graph(lazy, LEVELS)
+(lazy(0) + lazy(1)).unlazy()
+
+print("fib({}) graph: {} unique nodes, {} visits without visited set".format(
+    LEVELS, len(evalcache.lazy.tree_objects(root)), tree_visits(LEVELS)))
+print("{:<32} {:>12}".format("utility", "time, ms"))
+for name, func in (
+    ("tree_objects", evalcache.lazy.tree_objects),
+    ("tree_needeval", evalcache.lazy.tree_needeval),
+    ("collect_tree_information", evalcache.lazy.collect_tree_information),
+    ("execution_emulate_information", evalcache.lazy.execution_emulate_information),
+    ("print_tree", print_tree),
+):
+    print("{:<32} {:>12.3f}".format(name, bench(func, root) * 1e3))
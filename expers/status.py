@@ -15,27 +15,25 @@ lazy = evalcache.Lazy(
     cache=cache, status_notify=True
 )
 
-def stcb(root):
-	arr = evalcache.lazy.tree_objects(root)
-	print("total:{}".format(len(arr)))
+def stcb(root, progress):
+	print("total:{} toload:{} toeval:{}".format(
+		progress.total, progress.toload, progress.toeval))
 
 def sncb(root, obj):
-	arrs = evalcache.lazy.tree_needeval(root)
-	print("toload:{} toeval:{}".format(len(arrs.toload), len(arrs.toeval)))
-
-def ftcb(root):
 	pass
-	#print("ftcb")
 
-def fncb(root, obj):
-	arrs = evalcache.lazy.tree_needeval(root)
-	print("toload:{} toeval:{}".format(len(arrs.toload), len(arrs.toeval)))
-	#print("fncb")
+def ftcb(root, progress):
+	print("done:{} elapsed:{:.3f}s".format(progress.done, progress.elapsed))
+
+def fncb(root, obj, progress):
+	eta = "-" if progress.eta is None else "{:.3f}s".format(progress.eta)
+	print("loaded:{} evaluated:{} remaining:{} eta:{}".format(
+		progress.loaded, progress.evaluated, progress.remaining, eta))
 
-lazy.set_start_tree_evaluation_callback(stcb)
+lazy.set_start_tree_evaluation_callback(stcb, progress=True)
 lazy.set_start_node_evaluation_callback(sncb)
-lazy.set_fini_tree_evaluation_callback(ftcb)
-lazy.set_fini_node_evaluation_callback(fncb)
+lazy.set_fini_tree_evaluation_callback(ftcb, progress=True)
+lazy.set_fini_node_evaluation_callback(fncb, progress=True)
 
 a = lazy(1)
 b = lazy(2)
@@ -10,6 +10,8 @@ import unittest
 import test_environment
 import evalcache
 import hashlib
+import os
+import pickle
 
 
 class A:
@@ -233,6 +235,24 @@ class TestOptions(unittest.TestCase):
         self.assertNotEqual(flazy_11, flazy_12)
         self.assertNotEqual(flazy_21, flazy_22)
 
+    def test_pickle_lazifier(self):
+        lazy = evalcache.Lazy(
+            cache=evalcache.DirCache(test_environment.dircache_path),
+            algo="sha512",
+            workers=2,
+            registry_size=10,
+        )
+        copy = pickle.loads(pickle.dumps(lazy))
+
+        self.assertIs(type(copy), evalcache.Lazy)
+        self.assertEqual(copy.cache.dirpath, lazy.cache.dirpath)
+        self.assertEqual(copy.workers, 2)
+        self.assertEqual(lazy(1).__lazyhexhash__, copy(1).__lazyhexhash__)
+
+        memoize = pickle.loads(pickle.dumps(evalcache.Memoize()))
+        self.assertIs(type(memoize), evalcache.Memoize)
+        self.assertTrue(memoize.onuse)
+
 class TestAtackStability(unittest.TestCase):
     def tearDown(self):
         test_environment.clean_onplace_memoize()
@@ -311,6 +331,1306 @@ class TestDirCacheClean(unittest.TestCase):
         )
 
 
+class TestHashDispatch(unittest.TestCase):
+    def test_subclass_dispatch(self):
+        class MyList(list):
+            def __repr__(self):
+                return "MyList"
+
+        lazy = evalcache.LazyHash()
+        self.assertNotEqual(
+            lazy(MyList([1, 2])).__lazyhash__, lazy(MyList([1, 3])).__lazyhash__
+        )
+
+    def test_register_invalidates_dispatch(self):
+        class Point:
+            def __init__(self, x):
+                self.x = x
+
+            def __repr__(self):
+                return "Point"
+
+        lazy = evalcache.LazyHash()
+        self.assertEqual(lazy(Point(1)).__lazyhash__, lazy(Point(2)).__lazyhash__)
+
+        evalcache.lazy.hashfuncs[Point] = lambda m, obj, lobj: evalcache.lazy.updatehash(
+            m, obj.x, lobj
+        )
+        try:
+            self.assertNotEqual(
+                lazy(Point(1)).__lazyhash__, lazy(Point(2)).__lazyhash__
+            )
+        finally:
+            del evalcache.lazy.hashfuncs[Point]
+
+        self.assertEqual(lazy(Point(1)).__lazyhash__, lazy(Point(2)).__lazyhash__)
+
+
+class TestFunctionSourceCache(unittest.TestCase):
+    def test_source_inspected_once(self):
+        import inspect
+        import unittest.mock
+
+        lazy = evalcache.LazyHash()
+
+        def foo(a):
+            return a
+
+        def bar(a):
+            return a
+
+        with unittest.mock.patch.object(
+            inspect, "getsource", wraps=inspect.getsource
+        ) as getsource:
+            foo_hashes = set(lazy(foo).__lazyhexhash__ for i in range(100))
+            bar_hashes = set(lazy(bar).__lazyhexhash__ for i in range(100))
+
+        self.assertEqual(len(foo_hashes), 1)
+        self.assertEqual(len(bar_hashes), 1)
+        self.assertNotEqual(foo_hashes, bar_hashes)
+        self.assertEqual(getsource.call_count, 2)
+
+
+class TestImmutableArguments(unittest.TestCase):
+    def test_argument_digest_memo(self):
+        lazy = evalcache.LazyHash(fastdo=False, immutable_types=(tuple,))
+        plain = evalcache.LazyHash(fastdo=False)
+
+        @lazy
+        def foo(a, b):
+            return a[b]
+
+        big = tuple(range(1000))
+        other = tuple(range(1001))
+
+        self.assertEqual(foo(big, 1).__lazyhash__, foo(big, 1).__lazyhash__)
+        self.assertEqual(
+            foo(big, 1).__lazyhash__, foo(tuple(range(1000)), 1).__lazyhash__
+        )
+        self.assertNotEqual(foo(big, 1).__lazyhash__, foo(big, 2).__lazyhash__)
+        self.assertNotEqual(foo(big, 1).__lazyhash__, foo(other, 1).__lazyhash__)
+        self.assertIn(id(big), lazy.argument_digests)
+        self.assertEqual(len(lazy.argument_digests), 3)  # big, its copy and other
+        self.assertEqual(foo(big, 5).unlazy(), 5)
+
+        self.assertNotEqual(plain(big).__lazyhash__, plain(other).__lazyhash__)
+        self.assertEqual(len(plain.argument_digests), 0)
+
+    def test_argument_digest_memo_bounded(self):
+        lazy = evalcache.LazyHash(
+            fastdo=False, immutable_types=(tuple,), immutable_memo_size=10
+        )
+
+        @lazy
+        def foo(a):
+            return a
+
+        for i in range(100):
+            foo(((i, i + 1), (i,)))
+        self.assertEqual(len(lazy.argument_digests), 10)
+
+        # Nested tuples are hashed, but not memoized.
+        nested = ((1, 2), (3,))
+        foo(nested)
+        self.assertIn(id(nested), lazy.argument_digests)
+        self.assertNotIn(id(nested[0]), lazy.argument_digests)
+        self.assertEqual(
+            foo(nested).__lazyhash__, foo(((1, 2), (3,))).__lazyhash__
+        )
+
+
+class TestDeferredHash(unittest.TestCase):
+    def test_deferred_hash(self):
+        eager = evalcache.Lazy(cache={})
+        deferred = evalcache.Lazy(cache={}, deferred_hash=True)
+
+        def build(lazy):
+            a = lazy(1)
+            b = lazy(2)
+            return (a + b) * a - b, a
+
+        eager_node, _ = build(eager)
+        deferred_node, endpoint = build(deferred)
+
+        self.assertTrue(endpoint.__lazy_hash_known__())
+        self.assertFalse(deferred_node.__lazy_hash_known__())
+        self.assertEqual(len(deferred.objects), 2)
+
+        self.assertEqual(deferred_node.__lazyhexhash__, eager_node.__lazyhexhash__)
+        self.assertEqual(deferred_node.__lazyhash__, eager_node.__lazyhash__)
+        self.assertEqual(len(deferred.objects), 5)
+        self.assertEqual(evalcache.unlazy(deferred_node), 1)
+
+    def test_deep_deferred_chain(self):
+        eager = evalcache.Lazy(cache={})
+        deferred = evalcache.Lazy(cache={}, deferred_hash=True, iterative=True)
+
+        nodes = []
+        for lazy in (eager, deferred):
+            node = lazy(0)
+            for i in range(sys.getrecursionlimit() * 2):
+                node = node + 1
+            nodes.append(node)
+
+        self.assertFalse(nodes[1].__lazy_hash_known__())
+        self.assertEqual(nodes[1].__lazyhexhash__, nodes[0].__lazyhexhash__)
+        self.assertEqual(evalcache.unlazy(nodes[1]), sys.getrecursionlimit() * 2)
+
+    def test_key_computed_once(self):
+        lazy = evalcache.Lazy(cache={}, key_namespace="ns")
+        node = lazy(1) + 2
+        key = node.__lazyhexhash__
+
+        self.assertTrue(key.endswith(".ns"))
+        self.assertIs(node.__lazyhexhash__, key)
+
+
+class TaggedLazyObject(evalcache.lazy.LazyObject):
+    def __init__(self, *args, **kwargs):
+        evalcache.lazy.LazyObject.__init__(self, *args, **kwargs)
+        self.tag = "tagged"
+
+
+class TestSlottedObject(unittest.TestCase):
+    def test_layout(self):
+        self.assertEqual(evalcache.lazy.LazyObject.__dictoffset__, 0)
+
+        lazy = evalcache.Lazy(cache={})
+        node = lazy(1) + 2
+        self.assertEqual(node.__lazyflags__, evalcache.lazy.ENCACHE_FLAG | evalcache.lazy.DECACHE_FLAG)
+        self.assertEqual(node.__lazyhexhash__, node.__lazyhash__.hex())
+
+        node.__encache__ = False
+        self.assertFalse(node.__encache__)
+        self.assertTrue(node.__decache__)
+        self.assertEqual(node.unlazy(), 3)
+        self.assertTrue(node.__lazyheap__)
+        self.assertEqual(len(lazy.cache), 0)
+
+    def test_subclass(self):
+        lazy = evalcache.Lazy(cache={})
+        f = lazy.lazy(cls=TaggedLazyObject)(lambda x: x + 1)
+        node = evalcache.lazy.lazyinvoke(f, f, (1,), cls=TaggedLazyObject)
+
+        self.assertEqual(f.tag, "tagged")
+        self.assertEqual(node.tag, "tagged")
+        self.assertEqual(node.unlazy(), 2)
+        self.assertEqual(lazy.cache[node.__lazyhexhash__], 2)
+
+
+class TestHashAlgorithms(unittest.TestCase):
+    def tearDown(self):
+        test_environment.full_clean()
+
+    def test_namespaced_keys(self):
+        cache = evalcache.DirCache_v2(test_environment.dircache_path2)
+        default = evalcache.Lazy(cache=cache)
+        sha256 = evalcache.Lazy(cache=cache, algo="sha256")
+        fast = evalcache.Lazy(cache=cache, algo="blake2b-128")
+
+        self.assertEqual(default(1).__lazyhexhash__, sha256(1).__lazyhexhash__)
+        self.assertTrue(fast(1).__lazyhexhash__.endswith(".blake2b-128"))
+        self.assertEqual(len(fast(1).__lazyhash__), 16)
+
+        self.assertEqual((fast(1) + fast(2)).unlazy(), 3)
+        self.assertEqual((default(1) + default(2)).unlazy(), 3)
+        self.assertEqual(len(cache.keys()), 2)
+        self.assertEqual((fast(1) + fast(2)).unlazy(), 3)
+
+
+class TestKeyNamespaces(unittest.TestCase):
+    def test_callable_namespaces(self):
+        import functools
+
+        def key(algo):
+            return evalcache.Lazy(cache={}, algo=algo)(1).__lazyhexhash__
+
+        self.assertEqual(key(hashlib.sha512), key("sha512"))
+        self.assertTrue(key(hashlib.sha512).endswith(".sha512"))
+        self.assertEqual(key(hashlib.sha256), key("sha256"))
+        self.assertNotIn(".", key(hashlib.sha256))
+        self.assertEqual(
+            key(functools.partial(hashlib.blake2b, digest_size=16)), key("blake2b-128")
+        )
+        # Equal digest sizes of different algorithms.
+        self.assertTrue(key(hashlib.blake2s).endswith(".blake2s"))
+        self.assertTrue(key(hashlib.sha3_256).endswith(".sha3_256"))
+
+
+class Streamed:
+    def __init__(self, data):
+        self.data = data
+
+    def __evalcache_hash__(self, m):
+        m.update(self.data)
+
+
+class NoRepr:
+    def __init__(self, a):
+        self.a = a
+
+
+class TestHashProtocol(unittest.TestCase):
+    def test_evalcache_hash_protocol(self):
+        lazy = evalcache.LazyHash()
+
+        self.assertEqual(
+            lazy(Streamed(b"abc")).__lazyhash__, lazy(Streamed(b"abc")).__lazyhash__
+        )
+        self.assertNotEqual(
+            lazy(Streamed(b"abc")).__lazyhash__, lazy(Streamed(b"abd")).__lazyhash__
+        )
+
+    def test_pickle_fallback(self):
+        import io
+        import contextlib
+
+        lazy = evalcache.LazyHash(pickle_hash=True)
+
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            self.assertEqual(lazy(NoRepr(1)).__lazyhash__, lazy(NoRepr(1)).__lazyhash__)
+            self.assertNotEqual(
+                lazy(NoRepr(1)).__lazyhash__, lazy(NoRepr(2)).__lazyhash__
+            )
+            self.assertNotEqual(
+                lazy(NoRepr(lazy(1))).__lazyhash__, lazy(NoRepr(lazy(2))).__lazyhash__
+            )
+        self.assertEqual(out.getvalue().count("WARNING"), 6)
+
+    def test_fallback_pedantic(self):
+        for pickle_hash in (False, True):
+            lazy = evalcache.LazyHash(pedantic=True, pickle_hash=pickle_hash)
+            with self.assertRaises(Exception):
+                lazy(NoRepr(1))
+
+
+class TestBufferHash(unittest.TestCase):
+    def test_buffers(self):
+        lazy = evalcache.LazyHash()
+        data = bytes(range(256)) * 8192
+
+        self.assertEqual(lazy(data).__lazyhash__, lazy(bytes(data)).__lazyhash__)
+        self.assertNotEqual(lazy(data).__lazyhash__, lazy(data[:-1]).__lazyhash__)
+        self.assertNotEqual(lazy(data).__lazyhash__, lazy(bytearray(data)).__lazyhash__)
+        self.assertEqual(
+            lazy(bytearray(data)).__lazyhash__, lazy(bytearray(data)).__lazyhash__
+        )
+
+    def test_noncontiguous_memoryview(self):
+        lazy = evalcache.LazyHash()
+        view = memoryview(bytes(range(256)) * 8192)[::3]
+
+        self.assertEqual(
+            lazy(view).__lazyhash__, lazy(memoryview(view.tobytes())).__lazyhash__
+        )
+
+
+class TestInputFile(unittest.TestCase):
+    def setUp(self):
+        import tempfile
+
+        self.tmpdir = tempfile.mkdtemp()
+        self.digests = evalcache.DirCache_v2(os.path.join(self.tmpdir, "digests"))
+        evalcache.inputfile.set_digest_cache(self.digests)
+
+    def tearDown(self):
+        import shutil
+
+        evalcache.inputfile.set_digest_cache(None)
+        shutil.rmtree(self.tmpdir)
+
+    def test_content_addressed(self):
+        lazy = evalcache.Lazy(cache={})
+
+        @lazy
+        def read(path):
+            with open(path) as fl:
+                return fl.read()
+
+        path = os.path.join(self.tmpdir, "input.txt")
+        copy = os.path.join(self.tmpdir, "copy.txt")
+        for p in (path, copy):
+            with open(p, "w") as fl:
+                fl.write("data")
+
+        node = read(evalcache.InputFile(path))
+        self.assertEqual(node.unlazy(), "data")
+        self.assertEqual(
+            node.__lazyhash__, read(evalcache.InputFile(copy)).__lazyhash__
+        )
+        self.assertEqual(len(self.digests.keys()), 2)
+
+        with open(path, "w") as fl:
+            fl.write("other data")
+        os.utime(path, ns=(0, 0))
+
+        node = read(evalcache.InputFile(path))
+        self.assertEqual(node.unlazy(), "other data")
+        self.assertEqual(len(self.digests.keys()), 3)
+
+    def test_default_storage(self):
+        evalcache.inputfile.set_digest_cache(None)
+        path = os.path.join(self.tmpdir, "input.txt")
+        with open(path, "w") as fl:
+            fl.write("data")
+
+        cachedir = os.path.join(self.tmpdir, "cache")
+        lazy = evalcache.Lazy(cache=evalcache.DirCache_v2(cachedir))
+        lazy(evalcache.InputFile(path))
+        store = evalcache.DirCache_v2(cachedir + ".inputfile")
+        self.assertEqual(len(store.keys()), 1)
+
+        evalcache.inputfile._digest_memo.clear()
+        lazy = evalcache.LazyHash()
+        self.assertEqual(
+            lazy(evalcache.InputFile(path)).__lazyhash__,
+            evalcache.LazyHash()(evalcache.InputFile(path)).__lazyhash__,
+        )
+
+
+class TestDirCacheThreads(unittest.TestCase):
+    def test_concurrent_prefix_creation(self):
+        import tempfile
+        import shutil
+        import concurrent.futures
+
+        path = tempfile.mkdtemp()
+        try:
+            cache = evalcache.DirCache_v2(os.path.join(path, "cache"))
+            keys = ["ab{:04d}".format(i) for i in range(200)]
+            with concurrent.futures.ThreadPoolExecutor(8) as executor:
+                list(executor.map(lambda k: cache.__setitem__(k, k), keys))
+
+            self.assertEqual(sorted(cache.contains_many(keys)), keys)
+            other = evalcache.DirCache_v2(os.path.join(path, "cache"))
+            self.assertEqual(sorted(other.keys()), keys)
+            self.assertEqual(other["ab0007"], "ab0007")
+
+            del cache["ab0001"]
+            del other["ab0001"]
+            self.assertNotIn("ab0001", other)
+        finally:
+            shutil.rmtree(path)
+
+    def test_dircache(self):
+        import tempfile
+        import shutil
+        import concurrent.futures
+
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        cache = evalcache.DirCache(os.path.join(path, "cache"))
+        keys = ["ab{:04d}".format(i) for i in range(100)]
+        with concurrent.futures.ThreadPoolExecutor(8) as executor:
+            list(executor.map(lambda k: cache.__setitem__(k, k), keys))
+
+        other = evalcache.DirCache(os.path.join(path, "cache"))
+        self.assertEqual(sorted(other.keys()), keys)
+        self.assertEqual(other["ab0007"], "ab0007")
+
+        del cache["ab0001"]
+        with self.assertRaises(KeyError):
+            del other["ab0001"]
+        self.assertNotIn("ab0001", other)
+        self.assertEqual(evalcache.lazy.broken_entry(other, "ab0001"), "fail")
+
+
+class TestHashProfiler(unittest.TestCase):
+    def test_aggregated_statistic(self):
+        lazy = evalcache.LazyHash(fastdo=False, updatehash_profiling=True)
+
+        @lazy
+        def foo(a):
+            return a
+
+        for i in range(10):
+            foo([(i, "a"), (i, "b")])
+
+        stat = lazy.hash_profiler.as_dict()
+        self.assertEqual(stat["types"]["list"]["calls"], 10)
+        self.assertEqual(stat["types"]["tuple"]["calls"], 20)
+        self.assertEqual(stat["hashfuncs"]["updatehash_list"]["calls"], 30)
+        self.assertEqual(stat["types"]["str"]["calls"], 20)
+        self.assertGreaterEqual(
+            stat["types"]["list"]["cumbytes"], stat["types"]["tuple"]["cumbytes"]
+        )
+        self.assertGreater(stat["total_bytes"], 0)
+        self.assertIn("tuple", lazy.hash_profiler.table())
+
+        lazy.hash_profiler.reset()
+        self.assertEqual(lazy.hash_profiler.as_dict()["types"], {})
+
+    def test_partial_hashfunc(self):
+        import functools
+
+        class Point:
+            def __init__(self, x):
+                self.x = x
+
+        def updatehash_point(m, obj, lobj, prefix):
+            evalcache.lazy.updatehash_str(m, prefix + str(obj.x), lobj)
+
+        evalcache.lazy.hashfuncs[Point] = functools.partial(updatehash_point, prefix="p")
+        try:
+            lazy = evalcache.LazyHash(fastdo=False, updatehash_profiling=True)
+            lazy(Point(1))
+            stat = lazy.hash_profiler.as_dict()
+            names = [k for k in stat["hashfuncs"] if k.startswith("functools.partial(")]
+            self.assertEqual(len(names), 1)
+            self.assertEqual(stat["hashfuncs"][names[0]]["calls"], 1)
+        finally:
+            del evalcache.lazy.hashfuncs[Point]
+
+
+class TestInterning(unittest.TestCase):
+    def test_shared_subexpression(self):
+        lazy = evalcache.Lazy(cache={}, interning=True)
+        calls = []
+
+        @lazy
+        def f(x):
+            calls.append(x)
+            return x * 2
+
+        a = f(3)
+        b = f(3)
+        self.assertIs(a, b)
+        self.assertIs(lazy.objects[a.__lazyhexhash__], a)
+
+        self.assertEqual(evalcache.unlazy(f(3) + f(3)), 12)
+        self.assertTrue(b.__lazyheap__)
+        self.assertEqual(calls, [3])
+
+    def test_different_options(self):
+        lazy = evalcache.Lazy(cache={}, interning=True)
+        f = lazy(lambda x: x)
+
+        self.assertIsNot(f(1), evalcache.lazy.lazyinvoke(f, f, (1,), cached=False))
+        self.assertIsNot(f(1), f(2))
+
+
+class TestObjectsRegistry(unittest.TestCase):
+    def build(self, lazy):
+        f = lazy(lambda x: x)
+        nodes = [f(i) for i in range(4)]
+        return f, [n.__lazyhexhash__ for n in nodes]
+
+    def test_weak(self):
+        import gc
+
+        lazy = evalcache.Lazy(cache={}, interning=True)
+        f, keys = self.build(lazy)
+        gc.collect()
+
+        self.assertEqual(list(lazy.objects.keys()), [f.__lazyhexhash__])
+        self.assertEqual(len(lazy.interned), 0)
+        self.assertEqual(lazy.objects_startswith(keys[0]), [])
+
+    def test_strong_lru(self):
+        import gc
+
+        lazy = evalcache.Lazy(cache={}, registry_size=2)
+        f, keys = self.build(lazy)
+        gc.collect()
+
+        self.assertEqual(sorted(lazy.objects.keys()), sorted(keys[2:] + [f.__lazyhexhash__]))
+        self.assertEqual(len(lazy.objects_startswith(keys[3])), 1)
+
+    def test_unbounded(self):
+        lazy = evalcache.Lazy(cache={}, registry_size=None)
+        f, keys = self.build(lazy)
+        self.assertEqual(len(lazy.objects), 5)
+
+
+class TestValueMemoryBudget(unittest.TestCase):
+    def test_drop_and_reload(self):
+        for iterative in (False, True):
+            lazy = evalcache.Lazy(cache={}, value_memory_budget=1000, iterative=iterative)
+            calls = []
+
+            @lazy
+            def block(i):
+                calls.append(i)
+                return bytes([i]) * 400
+
+            nodes = [block(i) for i in range(6)]
+            total = evalcache.unlazy(lazy(sum)([lazy(len)(n) for n in nodes]))
+
+            self.assertEqual(total, 2400)
+            self.assertLessEqual(lazy.retention.size, 1000)
+            self.assertEqual(sum(n.__lazyheap__ for n in nodes), 2)
+
+            self.assertEqual(nodes[0].unlazy(), bytes([0]) * 400)
+            self.assertEqual(calls, list(range(6)))
+            self.assertTrue(nodes[0].__lazyheap__)
+            self.assertFalse(nodes[4].__lazyheap__)
+
+    def test_not_persisted(self):
+        lazy = evalcache.Lazy(cache={}, value_memory_budget=10, encache=False)
+        node = lazy(bytes)(100)
+        self.assertEqual(len(node.unlazy()), 100)
+        self.assertTrue(node.__lazyheap__)
+        self.assertEqual(lazy.retention.size, 0)
+
+
+class TestPruning(unittest.TestCase):
+    def test_prune(self):
+        import gc
+        import weakref
+
+        for iterative in (False, True):
+            lazy = evalcache.Lazy(cache={}, prune=True, iterative=iterative)
+            a = lazy(2)
+            b = a * 3
+            root = b + 1
+            ref = weakref.ref(b)
+            del b
+
+            self.assertEqual(root.unlazy(), 7)
+            self.assertIsNone(root.generic)
+            self.assertEqual(root.args, ())
+            self.assertTrue(root.__lazypruned__)
+
+            gc.collect()
+            self.assertIsNone(ref())
+
+            node = lazy(2) * 3 + 1
+            self.assertEqual(node.__lazyhexhash__, root.__lazyhexhash__)
+            self.assertEqual(evalcache.unlazy(node), 7)
+
+    def test_pruned_without_value(self):
+        lazy = evalcache.Lazy(cache={}, prune=True)
+        node = lazy(2) + 1
+        node.unlazy()
+
+        lazy.cache.clear()
+        node.__lazyheap__ = False
+        with self.assertRaises(Exception):
+            node.unlazy()
+
+    def test_release_values(self):
+        lazy = evalcache.Lazy(cache={}, iterative=True, release_values=True)
+        calls = []
+
+        @lazy
+        def inc(x):
+            calls.append(x)
+            return x + 1
+
+        a = inc(0)
+        b = inc(a)
+        c = a + b
+        root = inc(c)
+
+        self.assertEqual(root.unlazy(), 4)
+        self.assertTrue(root.__lazyheap__)
+        self.assertFalse(any(n.__lazyheap__ for n in (a, b, c)))
+
+        self.assertEqual(c.unlazy(), 3)
+        self.assertEqual(calls, [0, 1, 3])
+
+    def test_release_values_rejected(self):
+        import asyncio
+        import concurrent.futures
+
+        with self.assertRaises(ValueError):
+            evalcache.Lazy(cache={}, release_values=True)
+        with self.assertRaises(ValueError):
+            evalcache.Lazy(cache={}, iterative=True, workers=2, release_values=True)
+
+        lazy = evalcache.Lazy(cache={}, iterative=True, release_values=True)
+        node = lazy(1) + 2
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            with self.assertRaises(ValueError):
+                evalcache.unlazy(node, executor=executor)
+        with self.assertRaises(ValueError):
+            asyncio.run(evalcache.aunlazy(node))
+
+    def test_pruned_is_not_endpoint(self):
+        lazy = evalcache.Lazy(cache={}, prune=True)
+        endpoint = lazy(2)
+        node = endpoint + 1
+        node.unlazy()
+
+        self.assertTrue(evalcache.lazy.is_trivial(endpoint))
+        self.assertFalse(evalcache.lazy.is_trivial(node))
+        info = evalcache.lazy.collect_tree_information(node)
+        self.assertEqual((info["trivial"], info["nontrivial"]), (0, 1))
+
+        node.__lazyvalue__ = None
+        node.__lazyheap__ = False
+        plan = evalcache.engine.Plan(node)
+        self.assertEqual(plan.toload, {node.__lazyhexhash__})
+        self.assertEqual(len(evalcache.lazy.tree_needeval(node).toload), 1)
+
+
+class TestTreeUtilities(unittest.TestCase):
+    def fib_graph(self, lazy, n):
+        nodes = [lazy(0), lazy(1)]
+        for i in range(2, n + 1):
+            nodes.append(nodes[i - 1] + nodes[i - 2])
+        return nodes
+
+    def test_shared_nodes(self):
+        lazy = evalcache.Lazy(cache={})
+        self.fib_graph(lazy, 30)[-1].unlazy()
+        root = self.fib_graph(lazy, 60)[-1]
+
+        self.assertEqual(len(evalcache.lazy.tree_objects(root)), 61)
+
+        needeval = evalcache.lazy.tree_needeval(root)
+        self.assertEqual(len(needeval.toeval), 30)
+        self.assertEqual(len(needeval.toload), 2)
+
+        self.assertEqual(
+            evalcache.lazy.execution_emulate_information(root),
+            {"need_to_do": 30, "need_to_load": 2},
+        )
+
+        info = evalcache.lazy.collect_tree_information(root)
+        self.assertEqual(len(info["hashes"]), 61)
+        self.assertEqual((info["trivial"], info["nontrivial"]), (2, 59))
+        self.assertEqual(info["incache"], 29)
+
+    def test_print_tree(self):
+        import io
+        import contextlib
+
+        lazy = evalcache.Lazy(cache={})
+        root = self.fib_graph(lazy, 30)[-1]
+
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            evalcache.print_tree(root)
+
+        text = out.getvalue()
+        self.assertEqual(text.count("hash: "), 29)
+        self.assertEqual(text.count("same: "), 27)
+
+
+class TestProgress(unittest.TestCase):
+    def test_counters(self):
+        for iterative in (False, True):
+            lazy = evalcache.Lazy(cache={}, status_notify=True, iterative=iterative)
+            a = lazy(1)
+            (a + 1).unlazy()
+
+            events = []
+            lazy.set_start_tree_evaluation_callback(
+                lambda root, progress: events.append(("start", progress.toload, progress.toeval)),
+                progress=True,
+            )
+            lazy.set_fini_node_evaluation_callback(
+                lambda root, obj, progress: events.append(
+                    ("node", progress.loaded, progress.evaluated, progress.remaining)
+                ),
+                progress=True,
+            )
+            calls = []
+            lazy.set_fini_tree_evaluation_callback(lambda root: calls.append(root))
+
+            root = (a + 1) * (a + 2) + 3
+            self.assertEqual(root.unlazy(), 9)
+
+            self.assertEqual(events[0], ("start", 1, 3))
+            self.assertEqual(events[-1], ("node", 1, 3, 0))
+            remaining = [e[3] for e in events if e[0] == "node"]
+            self.assertEqual(remaining, sorted(remaining, reverse=True))
+            self.assertIs(calls[0], root)
+            self.assertEqual(lazy.progress.done, 4)
+            self.assertIsNotNone(lazy.progress.eta)
+
+    def test_defaults_untouched(self):
+        lazy = evalcache.Lazy(cache={}, status_notify=True)
+        calls = []
+        lazy.set_fini_node_evaluation_callback(
+            lambda root, obj, verbose=False: calls.append(verbose)
+        )
+
+        (lazy(1) + 2).unlazy()
+        self.assertEqual(calls, [False, False])
+        self.assertIsNone(lazy.progress.root)
+
+
+class TestExecutionPlan(unittest.TestCase):
+    def test_recorded_costs(self):
+        def foo(a):
+            return [a] * 100
+
+        def bar(a, b):
+            return len(a) + len(b)
+
+        import shutil
+        import tempfile
+
+        for iterative in (False, True):
+            tmpdir = tempfile.mkdtemp()
+            self.addCleanup(shutil.rmtree, tmpdir)
+            cache = evalcache.DirCache_v2(os.path.join(tmpdir, "cache"))
+            lazy = evalcache.Lazy(cache=cache, record_costs=True, iterative=iterative)
+            lfoo = lazy(foo)
+
+            lfoo(1).unlazy()
+            lfoo(1).unlazy()
+            name = evalcache.costs.generic_name(lfoo(1))
+            self.assertEqual(lazy.costs.functions[name][0], 1)
+            self.assertEqual(len(lazy.costs.loads), 1)
+
+            keys = sorted(cache.keys())
+            lazy.save_costs()
+            self.assertEqual(sorted(cache.keys()), keys)
+            self.assertTrue(os.path.exists(os.path.join(tmpdir, "cache.costs")))
+            self.assertEqual(sorted(os.listdir(tmpdir)), ["cache", "cache.costs"])
+
+            other = evalcache.Lazy(cache=evalcache.DirCache_v2(os.path.join(tmpdir, "cache")))
+            root = other(bar)(other(foo)(1), other(foo)(2))
+            p = evalcache.plan(root)
+
+            self.assertEqual([s.action for s in p.steps], ["load", "eval", "eval"])
+            self.assertIs(p.steps[-1].obj, root)
+            self.assertEqual([s.key for s in p.unknown], [root.__lazyhexhash__])
+            # Loaded list is allocated by pickle, so its size differs a little.
+            self.assertAlmostEqual(
+                p.steps[1].nbytes, p.steps[0].nbytes, delta=p.steps[0].nbytes * 0.1
+            )
+            self.assertIs(p.critical_path[-1], p.steps[-1])
+            self.assertEqual(len(p.critical_path), 2)
+            self.assertAlmostEqual(p.seconds, sum(s.seconds for s in p.steps))
+            self.assertLessEqual(p.critical_seconds, p.seconds)
+            self.assertEqual(p.load_bytes, p.steps[0].nbytes)
+            self.assertNotIn(root.__lazyhexhash__, cache)
+
+    def test_costs_storage(self):
+        import shutil
+        import tempfile
+
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        path = os.path.join(tmpdir, "costs")
+
+        costs = evalcache.costs.Costs(limit=2)
+        lazy = evalcache.Lazy(cache={})
+        for i in range(3):
+            costs.record_load(lazy(i), 0.1, i)
+        self.assertEqual(list(costs.loads), [lazy(1).__lazyhexhash__, lazy(2).__lazyhexhash__])
+
+        costs.save(path)
+        self.assertFalse(costs.dirty)
+        mtime = os.stat(path).st_mtime_ns
+        os.utime(path, ns=(0, 0))
+        costs.save(path)
+        self.assertEqual(os.stat(path).st_mtime_ns, 0)
+        self.assertNotEqual(mtime, 0)
+
+        lazy = evalcache.Lazy(cache={}, record_costs=path)
+        self.assertEqual(len(lazy.costs.loads), 2)
+        lazy(lambda x: x)(1).unlazy()
+        self.assertEqual(len(lazy.cache), 1)
+        lazy.save_costs()
+        self.assertFalse(lazy.costs.dirty)
+
+    def test_empty(self):
+        lazy = evalcache.Lazy(cache={})
+        a = lazy(1)
+        self.assertEqual(evalcache.plan(a).steps, [])
+        self.assertEqual(evalcache.plan(3).seconds, 0)
+
+        root = a + 1
+        p = evalcache.plan(root)
+        self.assertEqual(len(p.toeval), 1)
+        self.assertEqual(len(p.unknown), 1)
+        self.assertIs(p.dominant.obj, root)
+
+
+class TestAdmission(unittest.TestCase):
+    def test_cheap_nodes_skipped(self):
+        import io
+        import time
+        import contextlib
+
+        def slow(a):
+            time.sleep(0.002)
+            return a
+
+        for iterative in (False, True):
+            cache = {}
+            lazy = evalcache.Lazy(cache=cache, admission=True, diag=True, iterative=iterative)
+            root = lazy(slow)(lazy(1) + 1) * 2 + 3
+
+            out = io.StringIO()
+            with contextlib.redirect_stdout(out):
+                self.assertEqual(root.unlazy(), 7)
+            msgs = [line.split()[0] for line in out.getvalue().splitlines()]
+
+            self.assertEqual(msgs.count("save"), 1)
+            self.assertEqual(msgs.count("skip"), 3)
+            self.assertEqual(len(cache), 1)
+            self.assertEqual((lazy.admission.stored, lazy.admission.skipped), (1, 3))
+
+            other = evalcache.Lazy(cache=cache, admission=True)
+            self.assertEqual((other(slow)(other(1) + 1) * 2 + 3).unlazy(), 7)
+
+    def test_thresholds(self):
+        policy = evalcache.admission.AdmissionPolicy(ratio=0)
+        cache = {}
+        lazy = evalcache.Lazy(cache=cache, admission=policy)
+        self.assertIs(lazy.admission, policy)
+        (lazy(1) + 2).unlazy()
+        self.assertEqual(len(cache), 1)
+
+    def test_chain_accumulates(self):
+        cache = {}
+        policy = evalcache.admission.AdmissionPolicy(ratio=2, load_latency=1e-4)
+        lazy = evalcache.Lazy(cache=cache, admission=policy, iterative=True)
+
+        node = lazy(0)
+        name = evalcache.costs.generic_name(node + 1)
+        # Mean duration of addition is fixed to 1e-5 s.
+        lazy.costs.functions[name] = [10 ** 9, 10 ** 4, 0]
+
+        for i in range(100):
+            node = node + 1
+        self.assertEqual(node.unlazy(), 100)
+
+        self.assertGreater(len(cache), 3)
+        self.assertLess(len(cache), 15)
+        self.assertEqual(policy.stored + policy.skipped, 100)
+
+
+class TestIterativeEngine(unittest.TestCase):
+    def test_deep_chain(self):
+        lazy = evalcache.Lazy(cache={}, iterative=True)
+
+        node = lazy(0)
+        for i in range(5 * sys.getrecursionlimit()):
+            node = node + 1
+
+        self.assertEqual(evalcache.unlazy(node), 5 * sys.getrecursionlimit())
+        self.assertEqual(len(lazy.cache), 5 * sys.getrecursionlimit())
+
+    def test_same_results(self):
+        results = []
+        for iterative in (False, True):
+            lazy = evalcache.Lazy(cache={}, iterative=iterative, status_notify=True)
+            events = []
+            lazy.set_start_node_evaluation_callback(
+                lambda root, obj: events.append(("start", obj.__lazyhexhash__))
+            )
+            lazy.set_fini_node_evaluation_callback(
+                lambda root, obj: events.append(("fini", obj.__lazyhexhash__))
+            )
+
+            @lazy
+            def foo(a, b, c=None):
+                return [a, b, c]
+
+            @lazy.lazy(prevent_unwrap_in_child=["b"])
+            def bar(a, b):
+                return a + evalcache.unlazy(b)
+
+            a = lazy(1)
+            value = foo(a + 1, [a, {"k": a * 2}], c=bar(a, a + 3)).unlazy()
+            results.append((value, events, sorted(lazy.cache.keys())))
+
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[1][0], [2, [1, {"k": 2}], 5])
+
+
+class BatchDictCache(dict):
+    def __init__(self):
+        super().__init__()
+        self.probes = 0
+        self.batches = []
+
+    def __contains__(self, key):
+        self.probes += 1
+        return super().__contains__(key)
+
+    def contains_many(self, keys):
+        self.batches.append(("contains", len(keys)))
+        return set(k for k in keys if dict.__contains__(self, k))
+
+    def get_many(self, keys):
+        self.batches.append(("get", len(keys)))
+        return {k: self[k] for k in keys if dict.__contains__(self, k)}
+
+
+class TestBatchedProbing(unittest.TestCase):
+    def make_tree(self, lazy):
+        a = lazy(1)
+        return ((a + 1) * (a + 2)) + ((a + 3) * (a + 4))
+
+    def test_tree_needeval(self):
+        lazy = evalcache.Lazy(cache=BatchDictCache())
+        self.assertEqual(evalcache.unlazy(self.make_tree(lazy)), 26)
+
+        lazy.cache.batches.clear()
+        lazy.cache.probes = 0
+        needeval = evalcache.lazy.tree_needeval(self.make_tree(lazy))
+
+        self.assertEqual(len(needeval.toload), 1)
+        self.assertEqual(len(needeval.toeval), 0)
+        self.assertEqual(lazy.cache.batches, [("contains", 1)])
+        self.assertEqual(lazy.cache.probes, 0)
+
+    def test_iterative_prefetch(self):
+        lazy = evalcache.Lazy(cache=BatchDictCache(), iterative=True)
+        a = lazy(1)
+        evalcache.unlazy((a + 1) * (a + 2))
+        evalcache.unlazy(a + 3)
+
+        lazy.cache.batches.clear()
+        lazy.cache.probes = 0
+        self.assertEqual(evalcache.unlazy(self.make_tree(lazy)), 26)
+
+        # Probes of doubling windows of levels, which don't go below stored nodes,
+        # one batched load and no per-key probes.
+        self.assertEqual(
+            lazy.cache.batches, [("contains", 1), ("contains", 6), ("get", 2)]
+        )
+        self.assertEqual(lazy.cache.probes, 0)
+        self.assertEqual(len(lazy.cache), 7)
+
+    def test_recursive_prefetch(self):
+        lazy = evalcache.Lazy(cache=BatchDictCache())
+        a = lazy(1)
+        evalcache.unlazy((a + 1) * (a + 2))
+        evalcache.unlazy(a + 3)
+
+        lazy.cache.batches.clear()
+        lazy.cache.probes = 0
+        self.assertEqual(evalcache.unlazy(self.make_tree(lazy)), 26)
+        self.assertEqual(
+            lazy.cache.batches, [("contains", 1), ("contains", 6), ("get", 2)]
+        )
+        self.assertEqual(lazy.cache.probes, 0)
+
+    def test_deep_chain_windows(self):
+        lazy = evalcache.Lazy(cache=BatchDictCache(), iterative=True)
+        node = lazy(0)
+        for i in range(100):
+            node = node + 1
+
+        self.assertEqual(evalcache.unlazy(node), 100)
+        contains = [n for op, n in lazy.cache.batches if op == "contains"]
+        self.assertEqual(contains, [1, 2, 4, 8, 16, 32, 37])
+
+    def test_bounded_batches(self):
+        lazy = evalcache.Lazy(cache=BatchDictCache(), iterative=True, prefetch_limit=1)
+        a = lazy(1)
+        evalcache.unlazy((a + 1) * (a + 2))
+        evalcache.unlazy(a + 3)
+
+        lazy.cache.batches.clear()
+        self.assertEqual(evalcache.unlazy(self.make_tree(lazy)), 26)
+        self.assertEqual(
+            lazy.cache.batches, [("contains", 1), ("contains", 6), ("get", 1), ("get", 1)]
+        )
+
+        # Stored root is loaded without planning of the tree.
+        lazy.cache.batches.clear()
+        self.assertEqual(evalcache.unlazy(self.make_tree(lazy)), 26)
+        self.assertEqual(lazy.cache.batches, [("contains", 1), ("get", 1)])
+
+    def test_dircache_v2(self):
+        import shutil
+        import tempfile
+
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        cache = evalcache.DirCache_v2(os.path.join(tmpdir, "batched"))
+        cache["aa01"] = 1
+        cache["ab02"] = 2
+        self.assertEqual(cache.contains_many(["aa01", "ab02", "ac03"]), {"aa01", "ab02"})
+        self.assertEqual(cache.get_many(["aa01", "ac03"]), {"aa01": 1})
+
+
+class SlowDictCache(dict):
+    thread_safe = True
+
+    def __init__(self):
+        import threading
+
+        super().__init__()
+        self.lock = threading.Lock()
+        self.loading = 0
+        self.max_loading = 0
+
+    def __getitem__(self, key):
+        import time
+
+        with self.lock:
+            self.loading += 1
+            self.max_loading = max(self.max_loading, self.loading)
+        time.sleep(0.02)
+        with self.lock:
+            self.loading -= 1
+        value = dict.__getitem__(self, key)
+        if isinstance(value, Broken):
+            raise pickle.UnpicklingError("broken entry")
+        return value
+
+
+class Broken:
+    pass
+
+
+class TestReadAhead(unittest.TestCase):
+    def evaluate(self, iterative, limit):
+        lazy = evalcache.Lazy(
+            cache=SlowDictCache(), iterative=iterative, prefetch=4, prefetch_limit=limit
+        )
+        leaves = [lazy(i) * 2 for i in range(8)]
+        for leaf in leaves:
+            leaf.unlazy()
+
+        leaves = [lazy(i) * 2 for i in range(8)]
+        value = evalcache.unlazy(lazy(sum)(leaves))
+        return value, lazy.cache.max_loading
+
+    def test_overlapped_loads(self):
+        for iterative in (False, True):
+            value, max_loading = self.evaluate(iterative, 8)
+            self.assertEqual(value, 56)
+            self.assertGreater(max_loading, 1)
+
+    def test_limit(self):
+        for iterative in (False, True):
+            value, max_loading = self.evaluate(iterative, 2)
+            self.assertEqual(value, 56)
+            self.assertLessEqual(max_loading, 2)
+
+    def test_broken_entry(self):
+        lazy = evalcache.Lazy(cache=SlowDictCache(), prefetch=2)
+        node = lazy(3) + 4
+        lazy.cache[node.__lazyhexhash__] = Broken()
+
+        self.assertEqual(evalcache.unlazy(lazy(3) + 4), 7)
+        self.assertEqual(lazy.cache[node.__lazyhexhash__], 7)
+
+
+class TestParallelEvaluation(unittest.TestCase):
+    def test_independent_subtrees(self):
+        import threading
+        import concurrent.futures
+
+        lazy = evalcache.Lazy(cache={})
+        barrier = threading.Barrier(2, timeout=10)
+        calls = []
+
+        @lazy
+        def branch(i):
+            calls.append(i)
+            barrier.wait()
+            return i
+
+        @lazy
+        def leaf(i):
+            calls.append(-i)
+            return i
+
+        root = branch(1) + branch(2) + leaf(3) * leaf(3)
+
+        with concurrent.futures.ThreadPoolExecutor(4) as executor:
+            self.assertEqual(evalcache.unlazy(root, executor=executor), 12)
+
+        self.assertEqual(sorted(calls), [-3, 1, 2])
+        self.assertEqual(len(lazy.cache), 6)
+
+    def test_workers_option(self):
+        lazy = evalcache.Lazy(cache={}, workers=2)
+        sequential = evalcache.Lazy(cache={})
+
+        for lz in (lazy, sequential):
+            a = lz(1)
+            b = lz(2)
+            (a + b * a - (a + b)).unlazy()
+
+        self.assertEqual(lazy.cache, sequential.cache)
+
+    def test_workers_known_values(self):
+        import concurrent.futures
+
+        lazy = evalcache.Lazy(cache={}, workers=2)
+        a = lazy(1) + 2
+        self.assertEqual(evalcache.unlazy(a), 3)
+        self.assertEqual(evalcache.unlazy(a), 3)
+        self.assertEqual(evalcache.unlazy(lazy(3)), 3)
+
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            self.assertEqual(evalcache.unlazy(a, executor=executor), 3)
+
+
+class TestProcessEvaluation(unittest.TestCase):
+    def tearDown(self):
+        test_environment.clean()
+
+    def test_process_pool(self):
+        import concurrent.futures
+
+        lazy = test_environment.lazy
+        local = lazy(lambda a, b: a - b)
+
+        root = local(
+            test_environment.process_square(3) + test_environment.process_square(4),
+            lazy(1),
+        )
+
+        with concurrent.futures.ProcessPoolExecutor(2) as executor:
+            self.assertEqual(evalcache.unlazy(root, executor=executor), 24)
+            pid = evalcache.unlazy(test_environment.process_pid(1), executor=executor)
+
+        self.assertNotEqual(pid, os.getpid())
+        self.assertEqual(test_environment.count_cached_objects(), 5)
+        self.assertEqual(
+            sorted(lazy.cache.keys()), sorted(os.listdir(test_environment.dircache_path))
+        )
+
+    def test_broken_argument(self):
+        import io
+        import contextlib
+        import concurrent.futures
+
+        lazy = test_environment.lazy
+        square = test_environment.process_square(5)
+        square.unlazy()
+
+        path = os.path.join(test_environment.dircache_path, square.__lazyhexhash__)
+        with open(path, "rb") as f:
+            data = f.read()
+        with open(path, "wb") as f:
+            f.write(data[:len(data) // 2])
+
+        root = test_environment.process_square(test_environment.process_square(5))
+        out = io.StringIO()
+        with concurrent.futures.ProcessPoolExecutor(2) as executor:
+            with contextlib.redirect_stdout(out):
+                self.assertEqual(evalcache.unlazy(root, executor=executor), 625)
+
+        self.assertIn("Inconsistent pickling", out.getvalue())
+        self.assertEqual(lazy.cache[square.__lazyhexhash__], 25)
+
+
+class AsyncDictCache:
+    def __init__(self):
+        self.data = {}
+        self.calls = []
+
+    async def acontains(self, key):
+        self.calls.append("contains")
+        return key in self.data
+
+    async def aget(self, key):
+        self.calls.append("get")
+        return self.data[key]
+
+    async def aset(self, key, value):
+        self.calls.append("set")
+        self.data[key] = value
+
+    async def adel(self, key):
+        del self.data[key]
+
+
+class TestAsyncEvaluation(unittest.TestCase):
+    def test_aunlazy(self):
+        import asyncio
+
+        cache = AsyncDictCache()
+        lazy = evalcache.Lazy(cache=cache)
+        calls = []
+
+        @lazy
+        async def afoo(a):
+            calls.append(("afoo", a))
+            await asyncio.sleep(0.01)
+            return a * 2
+
+        @lazy
+        def foo(a):
+            calls.append(("foo", a))
+            return a + 1
+
+        async def main():
+            root = afoo(foo(1)) + afoo(foo(1)) + foo(lazy(2))
+            other = afoo(foo(1))
+            return await asyncio.gather(evalcache.aunlazy(root), evalcache.aunlazy(other))
+
+        self.assertEqual(asyncio.run(main()), [11, 4])
+        self.assertEqual(sorted(calls), [("afoo", 2), ("foo", 1), ("foo", 2)])
+        self.assertEqual(len(cache.data), 5)
+        self.assertIn("set", cache.calls)
+
+        calls.clear()
+        lazy2 = evalcache.Lazy(cache=cache)
+        root = lazy2(foo.__lazyvalue__)(1)
+        self.assertEqual(asyncio.run(evalcache.aunlazy(root)), 2)
+        self.assertEqual(calls, [])
+
+    def test_broken_entry_removed(self):
+        import io
+        import asyncio
+        import contextlib
+
+        class RacingCache(AsyncDictCache):
+            async def aget(self, key):
+                # Another task drops the broken entry first.
+                del self.data[key]
+                raise pickle.UnpicklingError("broken entry")
+
+        lazy = evalcache.Lazy(cache=RacingCache())
+        node = lazy(1) + 2
+        lazy.cache.data[node.__lazyhexhash__] = None
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(asyncio.run(evalcache.aunlazy(node)), 3)
+        self.assertEqual(lazy.cache.data[node.__lazyhexhash__], 3)
+
+    def test_sync_dircache(self):
+        import asyncio
+
+        lazy = test_environment.lazy
+        root = test_environment.process_square(3) + lazy(1)
+        try:
+            self.assertEqual(asyncio.run(evalcache.aunlazy(root)), 10)
+            self.assertEqual(test_environment.count_cached_objects(), 2)
+        finally:
+            test_environment.clean()
+
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+@unittest.skipIf(numpy is None, "numpy is not installed")
+class TestNdarrayHash(unittest.TestCase):
+    def test_content_hash(self):
+        lazy = evalcache.LazyHash()
+        arr = numpy.arange(24, dtype=float).reshape(4, 6)
+
+        self.assertEqual(lazy(arr).__lazyhash__, lazy(arr.copy()).__lazyhash__)
+        self.assertNotEqual(
+            lazy(arr).__lazyhash__, lazy(arr.astype(numpy.float32)).__lazyhash__
+        )
+        self.assertNotEqual(
+            lazy(arr).__lazyhash__, lazy(arr.reshape(6, 4)).__lazyhash__
+        )
+
+    def test_noncontiguous_view(self):
+        lazy = evalcache.LazyHash()
+        arr = numpy.arange(3000).reshape(100, 30)
+
+        view = arr[::3, 1::2]
+        self.assertEqual(lazy(view).__lazyhash__, lazy(view.copy()).__lazyhash__)
+        self.assertEqual(
+            lazy(arr.T).__lazyhash__,
+            lazy(numpy.ascontiguousarray(arr.T)).__lazyhash__,
+        )
+
+
 def cont_test():
     nlazy = evalcache.Memoize(algo = hashlib.sha512)
     s = {}
@@ -15,6 +15,16 @@ memoize = evalcache.Memoize(onplace=False)
 onplace_memoize = evalcache.Memoize(onplace=True)
 
 
+@lazy
+def process_square(x):
+    return x * x
+
+
+@lazy
+def process_pid(i):
+    return os.getpid()
+
+
 def clean():
     for path in os.listdir(dircache_path):
         os.remove("{}/{}".format(dircache_path, path))